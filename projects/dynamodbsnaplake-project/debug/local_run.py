@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+"""
+This script runs the DynamoDB Snapshot to Datalake workflow locally, by
+interpreting the state machine definition, and prints the per step wall time.
+
+1. Run ``sfn_test.py`` once, save the printed input JSON to ``sfn_input.json``
+   in this folder.
+2. Set ``AWS_ENDPOINT_URL`` if you want to run against a moto server or
+   any other local AWS stand-in instead of a real AWS account.
+"""
+
+import os
+import json
+from datetime import datetime, timezone
+
+from boto_session_manager import BotoSesManager
+
+from dynamodbsnaplake.paths import dir_project_root
+from dynamodbsnaplake.vendor.parquet_dynamodb.sfn_def import (
+    make_state_machine_definition,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.local_runner import (
+    LocalRunner,
+    get_default_function_names,
+)
+
+# ------------------------------------------------------------------------------
+# Enter your test settings here.
+# ------------------------------------------------------------------------------
+aws_profile = "bmt_app_dev_us_east_1"
+max_workers = 8
+executor = "process"
+
+# ------------------------------------------------------------------------------
+# Don't change anything below this line.
+# ------------------------------------------------------------------------------
+bsm = BotoSesManager(profile_name=aws_profile)
+# the lambda_handler creates its own boto session from the environment
+os.environ["AWS_PROFILE"] = aws_profile
+os.environ["AWS_DEFAULT_REGION"] = bsm.aws_region
+
+path_sfn_input = dir_project_root.joinpath("debug", "sfn_input.json")
+sfn_input_data = json.loads(path_sfn_input.read_text())
+exec_id = datetime.now(timezone.utc).strftime("local-%Y-%m-%d-%H-%M-%S")
+exec_arn = f"arn:aws:states:{bsm.aws_region}:{bsm.aws_account_id}:execution:local:{exec_id}"
+
+runner = LocalRunner(bsm=bsm, max_workers=max_workers, executor=executor)
+result = runner.run(
+    definition=make_state_machine_definition(get_default_function_names()),
+    exec_arn=exec_arn,
+    sfn_input_data=sfn_input_data,
+)
+print(json.dumps(result.output, indent=4))
+print(result.report())
@@ -144,3 +144,7 @@ class StateMachineMixin:
     @property
     def sm_dynamodbsnaplake_workflow(self) -> StateMachine:
         return self.state_machines["dynamodbsnaplake_workflow"]
+
+    @property
+    def sm_dynamodbsnaplake_multi_table_workflow(self) -> StateMachine:
+        return self.state_machines["dynamodbsnaplake_multi_table_workflow"]
@@ -14,10 +14,12 @@ import dynamodbsnaplake.vendor.aws_ops_alpha.api as aws_ops_alpha
 from ...paths import (
     dir_lambda_deploy,
     path_source_zip,
+    path_lambda_deploy_merkle_json,
 )
 from ...git import git_repo
 from ...boto_ses import boto_ses_factory
-from ...vendor.hashes import hashes
+from ...logger import logger
+from ...vendor.hashes import MerkleTree, hashes
 
 if T.TYPE_CHECKING:  # pragma: no cover
     from .main import MainStack
@@ -28,8 +30,17 @@ USER_ENV_NAME = aws_ops_alpha.EnvVarNameEnum.USER_ENV_NAME.value
 
 class LambdaMixin:
     def mk_rg2_lbd(self: "MainStack"):
+        # only the files changed since the previous synth are hashed again
+        previous = MerkleTree.load(path_lambda_deploy_merkle_json)
+        tree = hashes.of_merkle_tree(dir_lambda_deploy, previous=previous, max_workers=8)
+        diff = tree.diff(previous)
+        if diff.is_changed:
+            logger.info(f"{len(diff.changed_files)} changed files in {dir_lambda_deploy}:")
+            for relpath in diff.changed_files:
+                logger.info(f"  {relpath}")
+        tree.dump(path_lambda_deploy_merkle_json)
+        source_sha256 = tree.root_hash
         # fmt: off
-        source_sha256 = hashes.of_paths([dir_lambda_deploy])
         KEY_FUNC = "func"
         KEY_ALIAS = "alias"
         self.lambda_func_mapper: T.Dict[
@@ -50,3 +50,7 @@ dir_cdk = dir_project_root / "cdk"
 # ------------------------------------------------------------------------------
 dir_lambda_deploy = dir_project_root.joinpath("build", "lambda", "deploy")
 path_source_zip = dir_project_root.joinpath("build", "lambda", "source.zip")
+# the merkle tree manifest of the previous ``dir_lambda_deploy`` fingerprint
+path_lambda_deploy_merkle_json = dir_project_root.joinpath(
+    "build", "lambda", "deploy-merkle.json"
+)
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+
+if __name__ == "__main__":
+    import pytest
+
+    pytest.main(["-s", "--tb=native"])
\ No newline at end of file
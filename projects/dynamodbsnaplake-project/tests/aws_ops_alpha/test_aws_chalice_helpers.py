@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor.hashes import MerkleTree
+from dynamodbsnaplake.vendor.aws_ops_alpha.aws_helpers.aws_chalice_helpers import (
+    get_source_sha256,
+)
+
+
+def test_get_source_sha256(tmp_path):
+    dir_lambda_app = tmp_path / "lambda_app"
+    dir_vendor = dir_lambda_app / "vendor" / "my_package"
+    (dir_lambda_app / ".chalice").mkdir(parents=True)
+    (dir_vendor / "sub").mkdir(parents=True)
+    pyproject_ops = SimpleNamespace(
+        dir_build=tmp_path / "build",
+        path_chalice_config=dir_lambda_app / ".chalice" / "config.json",
+        path_lambda_app_py=dir_lambda_app / "app.py",
+        dir_lambda_app_vendor_python_lib=dir_vendor,
+    )
+    pyproject_ops.path_chalice_config.write_text("{}")
+    pyproject_ops.path_lambda_app_py.write_text("app = 1")
+    (dir_vendor / "a.py").write_text("a = 1")
+    (dir_vendor / "sub" / "b.py").write_text("b = 1")
+
+    source_sha256 = get_source_sha256(pyproject_ops)
+    path_merkle_json = pyproject_ops.dir_build / "chalice-source-merkle.json"
+    tree = MerkleTree.load(path_merkle_json)
+    assert sorted(tree.files) == ["a.py", "sub/b.py"]
+
+    # nothing changed
+    assert get_source_sha256(pyproject_ops) == source_sha256
+
+    # a vendor file changed, only this file is in the diff
+    (dir_vendor / "sub" / "b.py").write_text("b = 2")
+    source_sha256_1 = get_source_sha256(pyproject_ops)
+    assert source_sha256_1 != source_sha256
+    assert MerkleTree.load(path_merkle_json).diff(tree).changed_files == ["sub/b.py"]
+
+    # the app.py changed
+    pyproject_ops.path_lambda_app_py.write_text("app = 2")
+    assert get_source_sha256(pyproject_ops) not in [source_sha256, source_sha256_1]
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.aws_ops_alpha.aws_helpers.aws_chalice_helpers",
+        preview=False,
+    )
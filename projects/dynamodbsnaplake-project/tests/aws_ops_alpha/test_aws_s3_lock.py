@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+import time
+import dataclasses
+from urllib.parse import urlsplit, unquote
+
+import moto
+import pytest
+import botocore.exceptions
+from botocore.awsrequest import AWSResponse
+
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor import aws_s3_lock
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor.aws_s3_lock import (
+    AlreadyLockedError,
+    LockLostError,
+    Lock,
+    Vault,
+    DynamoDBVault,
+    get_utc_now,
+    put_object_conditionally,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+class ConditionalPutEmulator:
+    """
+    moto 4.x ignores the ``If-None-Match`` / ``If-Match`` headers of
+    ``PutObject``. This ``before-call`` hook checks them against the current
+    object and short-circuits the call with the ``412 PreconditionFailed``
+    error that S3 would return, otherwise it lets moto handle the request.
+
+    The hook runs before the request is signed, so the headers are taken
+    from where :func:`put_object_conditionally` keeps them.
+    """
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+        self.n_rejected = 0
+
+    def _get_etag(self, bucket: str, key: str):
+        try:
+            return self.s3_client.head_object(Bucket=bucket, Key=key)["ETag"]
+        except botocore.exceptions.ClientError:
+            return None
+
+    @staticmethod
+    def _parse_url(url: str):
+        # virtual hosted style: https://${bucket}.s3.amazonaws.com/${key}
+        # path style: https://s3.amazonaws.com/${bucket}/${key}
+        parts = urlsplit(url)
+        path = unquote(parts.path).lstrip("/")
+        if parts.netloc.startswith("s3."):
+            return path.split("/", 1)
+        return parts.netloc.split(".s3", 1)[0], path
+
+    def __call__(self, params, **kwargs):
+        headers = getattr(aws_s3_lock._conditional_headers, "headers", None) or {}
+        if_none_match = headers.get("If-None-Match")
+        if_match = headers.get("If-Match")
+        if if_none_match is None and if_match is None:
+            return None
+        bucket, key = self._parse_url(params["url"])
+        etag = self._get_etag(bucket, key)
+        if if_none_match == "*" and etag is not None:
+            return self.precondition_failed(params["url"])
+        if if_match is not None and if_match != etag:
+            return self.precondition_failed(params["url"])
+        return None
+
+    def precondition_failed(self, url: str):
+        self.n_rejected += 1
+        http_response = AWSResponse(url, 412, {}, None)
+        parsed_response = {
+            "Error": {
+                "Code": "PreconditionFailed",
+                "Message": "At least one of the pre-conditions you "
+                "specified did not hold",
+            },
+            "ResponseMetadata": {"HTTPStatusCode": 412},
+        }
+        return http_response, parsed_response
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        s3_client = cls.bsm.s3_client
+        s3_client.create_bucket(Bucket=cls.bucket)
+        cls.emulator = ConditionalPutEmulator(s3_client)
+        s3_client.meta.events.register_first(
+            "before-call.s3.PutObject",
+            cls.emulator,
+        )
+
+    def test_put_object_conditionally(self):
+        s3_client = self.bsm.s3_client
+        key = "put-object-conditionally.json"
+        n_rejected = self.emulator.n_rejected
+        etag = put_object_conditionally(
+            s3_client, self.bucket, key, "{}", if_none_match="*"
+        )
+        assert etag is not None
+        assert (
+            put_object_conditionally(
+                s3_client, self.bucket, key, "{}", if_none_match="*"
+            )
+            is None
+        )
+        assert (
+            put_object_conditionally(
+                s3_client, self.bucket, key, "{}", if_match='"stale"'
+            )
+            is None
+        )
+        assert (
+            put_object_conditionally(
+                s3_client, self.bucket, key, '{"a": 1}', if_match=etag
+            )
+            is not None
+        )
+        assert self.emulator.n_rejected == n_rejected + 2
+
+    def test_acquire_renew_release(self):
+        s3_client = self.bsm.s3_client
+        vault = Vault(bucket=self.bucket, key="acquire.json", expire=900)
+
+        lock = vault.acquire(s3_client, owner="alice")
+        with pytest.raises(AlreadyLockedError):
+            vault.acquire(s3_client, owner="bob")
+
+        # the owner can acquire it again to refresh the lock_time
+        lock = vault.acquire(s3_client, owner="alice")
+        etag = lock.etag
+        vault.renew(s3_client, lock)
+        assert lock.etag != etag
+
+        vault.release(s3_client, lock)
+        assert lock.owner is None
+        lock = vault.acquire(s3_client, owner="bob")
+        assert lock.owner == "bob"
+
+    def test_lost_race(self):
+        s3_client = self.bsm.s3_client
+        vault = Vault(bucket=self.bucket, key="race.json", expire=1)
+        lock_alice = vault.acquire(s3_client, owner="alice")
+        time.sleep(1)
+
+        # the lock is expired, bob takes it, alice's ETag is stale now
+        lock_bob = vault.acquire(s3_client, owner="bob")
+        assert lock_bob.etag != lock_alice.etag
+        with pytest.raises(LockLostError):
+            vault.renew(s3_client, lock_alice)
+        with pytest.raises(LockLostError):
+            vault.release(s3_client, lock_alice)
+        vault.release(s3_client, lock_bob)
+
+    def test_heartbeat(self):
+        s3_client = self.bsm.s3_client
+        vault = Vault(bucket=self.bucket, key="heartbeat.json", expire=900)
+
+        lock = vault.acquire(s3_client, owner="alice")
+        lock_time = lock.lock_time
+        with vault.heartbeat(s3_client, lock, interval=0.05):
+            time.sleep(0.3)
+        assert lock.lock_time > lock_time
+        vault.release(s3_client, lock)
+
+    def test_heartbeat_lock_lost(self):
+        s3_client = self.bsm.s3_client
+
+        def steal(vault: Vault):
+            # another owner overwrites the lock object, the ETag changes
+            s3_client.put_object(
+                Bucket=self.bucket,
+                Key=vault.key,
+                Body=Lock(
+                    expire=900,
+                    lock_time=get_utc_now().isoformat(),
+                    release_time=None,
+                    owner="bob",
+                ).to_json(),
+            )
+
+        # the renewal fails, and the error is raised when the context exits
+        vault = Vault(bucket=self.bucket, key="heartbeat-lost-1.json", expire=900)
+        lock = vault.acquire(s3_client, owner="alice")
+        with pytest.raises(LockLostError):
+            with vault.heartbeat(s3_client, lock, interval=0.05):
+                steal(vault)
+                time.sleep(0.3)
+
+        # the error raised in the with block is not hidden
+        vault = Vault(bucket=self.bucket, key="heartbeat-lost-2.json", expire=900)
+        lock = vault.acquire(s3_client, owner="alice")
+        with pytest.raises(ZeroDivisionError):
+            with vault.heartbeat(s3_client, lock, interval=0.05):
+                steal(vault)
+                time.sleep(0.3)
+                1 / 0
+
+    def test_heartbeat_other_error(self):
+        s3_client = self.bsm.s3_client
+        vault = Vault(bucket=self.bucket, key="heartbeat-error.json", expire=900)
+        lock = vault.acquire(s3_client, owner="alice")
+
+        def renew(s3_client, lock):
+            raise ConnectionError("network is down")
+
+        vault.renew = renew
+        with pytest.raises(ConnectionError):
+            with vault.heartbeat(s3_client, lock, interval=0.05):
+                time.sleep(0.3)
+
+class TestDynamoDBVault(BaseMockAws):
+    mock_list = [
+        moto.mock_dynamodb,
+    ]
+    table = "lock-table"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        DynamoDBVault.create_table(cls.bsm.dynamodb_client, table=cls.table)
+        # does nothing if the table exists
+        DynamoDBVault.create_table(cls.bsm.dynamodb_client, table=cls.table)
+
+    def get_waiters(self, vault: DynamoDBVault) -> list:
+        res = self.bsm.dynamodb_client.query(
+            TableName=self.table,
+            KeyConditionExpression="pk = :pk AND begins_with(sk, :prefix)",
+            ExpressionAttributeValues={
+                ":pk": {"S": vault.key},
+                ":prefix": {"S": "waiter#"},
+            },
+        )
+        return [item["owner"]["S"] for item in res["Items"]]
+
+    def test_contention_and_fencing_token(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(table=self.table, key="contention", expire=900)
+
+        lock = vault.acquire(client, owner="alice")
+        assert lock.fencing_token == 1
+        with pytest.raises(AlreadyLockedError):
+            vault.acquire(client, owner="bob")
+
+        # the owner can acquire it again, the fencing token still increases
+        lock = vault.acquire(client, owner="alice")
+        assert lock.fencing_token == 2
+        vault.renew(client, lock)
+        vault.release(client, lock)
+        assert lock.owner is None
+
+        lock = vault.acquire(client, owner="bob")
+        assert lock.fencing_token == 3
+        vault.release(client, lock)
+
+    def test_stale_lock_holder_is_rejected(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(table=self.table, key="stale", expire=1)
+
+        lock_alice = vault.acquire(client, owner="alice")
+        time.sleep(1.1)
+        # the lock is expired, bob takes it with a greater fencing token
+        lock_bob = vault.acquire(client, owner="bob")
+        assert lock_bob.fencing_token > lock_alice.fencing_token
+        with pytest.raises(LockLostError):
+            vault.renew(client, lock_alice)
+        with pytest.raises(LockLostError):
+            vault.release(client, lock_alice)
+
+        # even the same owner can't release with an old fencing token
+        lock_bob_old = dataclasses.replace(lock_bob)
+        lock_bob = vault.acquire(client, owner="bob")
+        with pytest.raises(LockLostError):
+            vault.release(client, lock_bob_old)
+        vault.release(client, lock_bob)
+
+    def test_heartbeat_lock_lost(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(table=self.table, key="heartbeat", expire=900)
+        lock = vault.acquire(client, owner="alice")
+        with pytest.raises(LockLostError):
+            with vault.heartbeat(client, lock, interval=0.05):
+                # someone else takes it, the fencing token changes
+                client.update_item(
+                    TableName=self.table,
+                    Key={"pk": {"S": vault.key}, "sk": {"S": "lock"}},
+                    UpdateExpression="SET #owner = :owner ADD fencing_token :one",
+                    ExpressionAttributeNames={"#owner": "owner"},
+                    ExpressionAttributeValues={
+                        ":owner": {"S": "bob"},
+                        ":one": {"N": "1"},
+                    },
+                )
+                time.sleep(0.3)
+
+    def test_waiter_queue_ordering(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(table=self.table, key="queue", expire=900)
+
+        # bob starts to wait before carol
+        now = time.time()
+        vault._wait(client, owner="bob", queue_time=now)
+        vault._wait(client, owner="carol", queue_time=now + 1)
+        assert self.get_waiters(vault) == ["bob", "carol"]
+
+        # the lock is free, but it is bob's turn
+        with pytest.raises(AlreadyLockedError):
+            vault._try_acquire(client, owner="carol", n_try=1)
+        lock = vault._try_acquire(client, owner="bob", n_try=1)
+        vault._stop_waiting(client, owner="bob", queue_time=now)
+        assert self.get_waiters(vault) == ["carol"]
+        vault.release(client, lock)
+
+        # now it is carol's turn, a newcomer's first try doesn't check the
+        # queue, but the lock is taken
+        lock = vault._try_acquire(client, owner="carol", n_try=1)
+        vault._stop_waiting(client, owner="carol", queue_time=now + 1)
+        with pytest.raises(AlreadyLockedError):
+            vault.acquire(client, owner="dave")
+        # dave gave up, and left the queue
+        assert self.get_waiters(vault) == []
+        vault.release(client, lock)
+
+    def test_gone_waiter_is_skipped(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(
+            table=self.table,
+            key="gone-waiter",
+            expire=900,
+            waiter_expire=1,
+        )
+        vault._wait(client, owner="bob", queue_time=time.time())
+        with pytest.raises(AlreadyLockedError):
+            vault._try_acquire(client, owner="carol", n_try=1)
+        # bob didn't check in for waiter_expire seconds
+        time.sleep(1.1)
+        lock = vault._try_acquire(client, owner="carol", n_try=1)
+        assert lock.owner == "carol"
+
+    def test_acquire_with_timeout(self):
+        client = self.bsm.dynamodb_client
+        vault = DynamoDBVault(table=self.table, key="timeout", expire=1)
+        vault.acquire(client, owner="alice")
+        # bob waits in the queue until alice's lock expires
+        lock = vault.acquire(client, owner="bob", timeout=5, max_backoff=0.2)
+        assert lock.owner == "bob"
+        assert self.get_waiters(vault) == []
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.aws_ops_alpha.vendor.aws_s3_lock",
+        preview=False,
+    )
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import subprocess
+
+import pytest
+
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor import conventional_commits
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor.conventional_commits import (
+    SEMANTIC_COMMIT_GROUPS,
+    is_feat_commit,
+    is_fix_commit,
+    is_test_commit,
+    is_utest_commit,
+    is_itest_commit,
+    is_ltest_commit,
+    is_doc_commit,
+    is_build_commit,
+    is_publish_commit,
+    is_release_commit,
+    classify_commit,
+    iter_git_log,
+    iter_classified_commits,
+)
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "tester",
+    "GIT_AUTHOR_EMAIL": "tester@example.com",
+    "GIT_COMMITTER_NAME": "tester",
+    "GIT_COMMITTER_EMAIL": "tester@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+
+def git(dir_repo, *args: str):
+    subprocess.run(
+        ["git", "-C", str(dir_repo), *args],
+        check=True,
+        capture_output=True,
+        env={**os.environ, **GIT_ENV},
+    )
+
+
+def commit(dir_repo, message: str):
+    path = dir_repo / ".git" / "COMMIT_MSG_FOR_TEST"
+    path.write_text(message)
+    git(dir_repo, "commit", "--allow-empty", "-q", "--cleanup=verbatim", "-F", str(path))
+
+
+@pytest.fixture
+def dir_repo(tmp_path):
+    git(tmp_path, "init", "-q")
+    return tmp_path
+
+
+def test_iter_git_log(dir_repo):
+    messages = [
+        "feat: add validator",
+        "fix(STORY-1): handle empty input\n\nThe body has\nmany lines.\n\n- and a list",
+        "not a conventional commit\n\nfeat: in the body is ignored",
+        "feat, utest: add tests",
+    ]
+    for message in messages:
+        commit(dir_repo, message)
+
+    commits = list(iter_git_log(dir_repo))
+    # newest first
+    assert [message for _, message in commits] == messages[::-1]
+    assert all(len(commit_id) == 40 for commit_id, _ in commits)
+
+    # a small chunk size splits the records across reads
+    assert list(iter_git_log(dir_repo, chunk_size=7)) == commits
+    assert list(iter_git_log(dir_repo, rev_range="HEAD~2..HEAD")) == commits[:2]
+
+    classified_commits = list(iter_classified_commits(dir_repo))
+    assert [commit.subject for commit in classified_commits] == [
+        "feat, utest: add tests",
+        "not a conventional commit",
+        "fix(STORY-1): handle empty input",
+        "feat: add validator",
+    ]
+    assert [commit.groups for commit in classified_commits] == [
+        {"feat", "test", "utest"},
+        frozenset(),
+        {"fix"},
+        {"feat"},
+    ]
+    assert classified_commits[2].commit.scope == "STORY-1"
+    assert classified_commits[1].commit is None
+
+
+def test_iter_git_log_bad_range(dir_repo):
+    commit(dir_repo, "feat: add validator")
+    with pytest.raises(subprocess.CalledProcessError) as e:
+        list(iter_git_log(dir_repo, rev_range="not-exists..HEAD"))
+    assert e.value.returncode != 0
+    assert b"not-exists" in e.value.stderr
+
+
+def test_iter_git_log_close_early(dir_repo, monkeypatch):
+    # the git log output is much larger than the pipe buffer, git is
+    # blocked on writing when the consumer stops
+    body = "x" * 200_000
+    for i in range(5):
+        commit(dir_repo, f"feat: commit {i}\n\n{body}")
+
+    procs = list()
+    popen = subprocess.Popen
+
+    def Popen(*args, **kwargs):
+        proc = popen(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(conventional_commits.subprocess, "Popen", Popen)
+
+    gen = iter_git_log(dir_repo, chunk_size=4096)
+    commit_id, message = next(gen)
+    assert message.startswith("feat: commit 4")
+    gen.close()
+    assert procs[0].returncode == -signal.SIGKILL
+    assert procs[0].stdout.closed
+
+
+def test_classify_commit():
+    is_commit_functions = {
+        "feat": is_feat_commit,
+        "fix": is_fix_commit,
+        "test": is_test_commit,
+        "utest": is_utest_commit,
+        "itest": is_itest_commit,
+        "ltest": is_ltest_commit,
+        "doc": is_doc_commit,
+        "build": is_build_commit,
+        "publish": is_publish_commit,
+        "release": is_release_commit,
+    }
+    assert set(is_commit_functions) == set(SEMANTIC_COMMIT_GROUPS)
+    messages = [
+        "feat: add validator",
+        "feature: add validator",
+        "fix(STORY-1)!: breaking fix",
+        "utest: unit test",
+        "itest, ltest: integration and load test",
+        "test: all test",
+        "doc, build: docs",
+        "pub: publish",
+        "publish, rls: release",
+        "release: 1.0.0",
+        "chore: nothing",
+        "dev, feat: deploy to dev",
+        "FEAT: upper case is not a type",
+        "not a conventional commit",
+        "feat, unknown: unknown type",
+        "",
+    ]
+    for message in messages:
+        groups = classify_commit(message)
+        for group, is_commit in is_commit_functions.items():
+            assert (group in groups) == is_commit(message), (message, group)
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.aws_ops_alpha.vendor.conventional_commits",
+        preview=False,
+    )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from dynamodbsnaplake.vendor.aws_ops_alpha.vendor.semantic_branch import (
+    InvalidSemanticNameError,
+    SemanticBranchEnum,
+    BRANCH_TYPE_WORDS,
+    is_certain_semantic_branch,
+    is_main_branch,
+    is_feature_branch,
+    is_build_branch,
+    is_doc_branch,
+    is_fix_branch,
+    is_release_branch,
+    is_cleanup_branch,
+    is_sandbox_branch,
+    is_develop_branch,
+    is_test_branch,
+    is_int_branch,
+    is_staging_branch,
+    is_qa_branch,
+    is_preprod_branch,
+    is_prod_branch,
+    is_blue_branch,
+    is_green_branch,
+    get_semantic_word,
+    get_branch_type,
+    SemanticBranchRule,
+)
+
+is_branch_functions = {
+    "main": is_main_branch,
+    "feature": is_feature_branch,
+    "build": is_build_branch,
+    "doc": is_doc_branch,
+    "fix": is_fix_branch,
+    "release": is_release_branch,
+    "cleanup": is_cleanup_branch,
+    "sandbox": is_sandbox_branch,
+    "develop": is_develop_branch,
+    "test": is_test_branch,
+    "int": is_int_branch,
+    "staging": is_staging_branch,
+    "qa": is_qa_branch,
+    "preprod": is_preprod_branch,
+    "prod": is_prod_branch,
+    "blue": is_blue_branch,
+    "green": is_green_branch,
+}
+
+# semantic word -> expected branch type
+word_to_branch_type = {
+    SemanticBranchEnum.main: "main",
+    SemanticBranchEnum.master: "main",
+    SemanticBranchEnum.feat: "feature",
+    SemanticBranchEnum.feature: "feature",
+    SemanticBranchEnum.build: "build",
+    SemanticBranchEnum.doc: "doc",
+    SemanticBranchEnum.fix: "fix",
+    SemanticBranchEnum.hotfix: None,
+    SemanticBranchEnum.rls: "release",
+    SemanticBranchEnum.release: "release",
+    SemanticBranchEnum.clean: "cleanup",
+    SemanticBranchEnum.cleanup: "cleanup",
+    SemanticBranchEnum.sbx: "sandbox",
+    SemanticBranchEnum.sandbox: "sandbox",
+    SemanticBranchEnum.dev: "develop",
+    SemanticBranchEnum.develop: "develop",
+    SemanticBranchEnum.tst: "test",
+    SemanticBranchEnum.test: "test",
+    SemanticBranchEnum.int: "int",
+    SemanticBranchEnum.stg: "staging",
+    SemanticBranchEnum.stage: "staging",
+    SemanticBranchEnum.staging: "staging",
+    SemanticBranchEnum.qa: "qa",
+    SemanticBranchEnum.preprod: "preprod",
+    SemanticBranchEnum.prd: "prod",
+    SemanticBranchEnum.prod: "prod",
+    SemanticBranchEnum.blue: "blue",
+    SemanticBranchEnum.green: "green",
+}
+
+
+def test_tables():
+    assert set(word_to_branch_type) == set(SemanticBranchEnum)
+    assert set(is_branch_functions) == set(BRANCH_TYPE_WORDS)
+
+
+@pytest.mark.parametrize("word", list(SemanticBranchEnum))
+def test_branch_type(word: SemanticBranchEnum):
+    branch_type = word_to_branch_type[word]
+    for name in [
+        word.value,
+        f"{word.value}/description",
+        f"{word.value}-123/description/more",
+        f" {word.value.upper()}-123/Description ",
+    ]:
+        assert get_semantic_word(name) == word.value
+        assert get_branch_type(name) == branch_type
+        for type_, is_branch in is_branch_functions.items():
+            assert is_branch(name) is (type_ == branch_type), (name, type_)
+        if branch_type is not None:
+            assert is_certain_semantic_branch(name, BRANCH_TYPE_WORDS[branch_type])
+
+    # the semantic word must be the whole first token
+    assert get_branch_type(f"{word.value}x/description") is None
+    assert get_branch_type(f"x{word.value}") is None
+
+
+def test_semantic_branch_rule():
+    rule = SemanticBranchRule(
+        rules={
+            "main": ["main", "master"],
+            "feature": ["feat", "feature"],
+        }
+    )
+    assert rule.is_certain_semantic_branch("master", "main") is True
+    assert rule.is_certain_semantic_branch("major", "main") is False
+    assert rule.is_certain_semantic_branch("feature-123/desc", "feature") is True
+    with pytest.raises(InvalidSemanticNameError):
+        rule.is_certain_semantic_branch("release", "release")
+
+    assert rule.parse_semantic_name("main") == "main"
+    assert rule.parse_semantic_name("feat-123/desc") == "feature"
+    with pytest.raises(InvalidSemanticNameError):
+        rule.parse_semantic_name("release/1.2.3")
+
+    with pytest.raises(InvalidSemanticNameError):
+        SemanticBranchRule(rules={"main": ["Ma-in"]}).parse_semantic_name("main")
+
+
+def test_semantic_branch_rule_first_rule_wins():
+    rules = {
+        "develop": ["dev", "develop"],
+        "sandbox": ["dev", "sbx"],
+    }
+    rule = SemanticBranchRule(rules=rules)
+    assert rule.parse_semantic_name("dev/description") == "develop"
+    assert rule.parse_semantic_name("sbx/description") == "sandbox"
+    # the keyword matches both rules
+    assert rule.is_certain_semantic_branch("dev", "develop") is True
+    assert rule.is_certain_semantic_branch("dev", "sandbox") is True
+
+    rule = SemanticBranchRule(rules=dict(reversed(list(rules.items()))))
+    assert rule.parse_semantic_name("dev/description") == "sandbox"
+    assert rule.parse_semantic_name("develop/description") == "develop"
+
+
+def test_semantic_branch_rule_cache_by_raw_name():
+    calls = list()
+
+    # the preprocessor is not idempotent, "alias" -> "main" -> "feature"
+    def preprocessor(name: str) -> str:
+        calls.append(name)
+        return {"alias": "main", "main": "feature"}.get(name, name)
+
+    rule = SemanticBranchRule(
+        rules={
+            "main": ["main"],
+            "feature": ["feature"],
+        },
+        preprocessor=preprocessor,
+    )
+    assert rule.parse_semantic_name("alias") == "main"
+    # "main" is the preprocessed name of "alias", it is not a cache hit
+    assert rule.parse_semantic_name("main") == "feature"
+    assert calls == ["alias", "main"]
+    # the same raw name is a cache hit, the preprocessor is not called again
+    assert rule.parse_semantic_name("alias") == "main"
+    assert rule.parse_semantic_name("main") == "feature"
+    assert calls == ["alias", "main"]
+    assert rule._parse_semantic_name_cache == {"alias": "main", "main": "feature"}
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.aws_ops_alpha.vendor.semantic_branch",
+        preview=False,
+    )
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+from decimal import Decimal
+
+import moto
+import pytest
+import polars as pl
+from s3pathlib import S3Path
+from dbsnaplake.api import S3Location
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.lake_index import LakeIndex
+from dynamodbsnaplake.vendor.parquet_dynamodb.bloom_filter import (
+    BloomFilter,
+    to_key,
+    write_bloom_filter,
+    find_files_by_record_id,
+    clear_bloom_filter_cache,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def test_add_many_matches_add():
+    key_list = [f"order-{i}" for i in range(5000)] + ["", "ünïcode"]
+    bloom_filter_1 = BloomFilter.new(n=len(key_list))
+    bloom_filter_2 = BloomFilter.new(n=len(key_list))
+    for key in key_list:
+        bloom_filter_1.add(key)
+    bloom_filter_2.add_many(key_list)
+    assert bloom_filter_1.bits == bloom_filter_2.bits
+    assert all(key in bloom_filter_2 for key in key_list)
+
+
+def test_to_key_matches_build_side():
+    df = pl.DataFrame(
+        {
+            "id": [1, 2],
+            "amount": [1.0, 2.5],
+            "flag": [True, False],
+            "name": ["a", "b"],
+        }
+    )
+    columns = ["id", "amount", "flag", "name"]
+    bloom_filter = BloomFilter.from_df(df=df, columns=columns)
+    assert bloom_filter.dtypes == ["Int64", "Float64", "Boolean", "String"]
+    # DynamoDB number comes back as Decimal from boto3
+    for record_id in [
+        (1, 1.0, True, "a"),
+        (Decimal("1"), Decimal("1"), True, "a"),
+        (Decimal("2"), Decimal("2.5"), False, "b"),
+    ]:
+        assert to_key(record_id, dtypes=bloom_filter.dtypes) in bloom_filter
+
+    assert to_key(True) == "true"
+    assert to_key(1.0) == "1.0"
+    assert to_key(Decimal("1")) == "1"
+
+    for record_id in [None, b"a", object(), ("a", None)]:
+        with pytest.raises(TypeError):
+            to_key(record_id)
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=cls.bucket)
+        cls.s3_loc = S3Location(
+            s3uri_staging=f"s3://{cls.bucket}/staging/",
+            s3uri_datalake=f"s3://{cls.bucket}/datalake/",
+        )
+
+    def test_find_files_by_record_id(self):
+        s3_client = self.bsm.s3_client
+        clear_bloom_filter_cache()
+        files = list()
+        for year in ["2023", "2024"]:
+            for i in range(3):
+                s3path = self.s3_loc.s3dir_datalake.joinpath(
+                    f"year={year}", f"{year}-{i}.parquet"
+                )
+                df = pl.DataFrame(
+                    {
+                        "pk": [f"{year}-{i}-{j}" for j in range(100)],
+                        "sk": list(range(100)),
+                    }
+                )
+                bloom_uri = write_bloom_filter(
+                    s3_client=s3_client,
+                    s3_loc=self.s3_loc,
+                    df=df,
+                    s3path_data=s3path,
+                    columns=["pk", "sk"],
+                ).uri
+                files.append(
+                    {
+                        "uri": s3path.uri,
+                        "partition": {"year": year},
+                        "stats": {},
+                        "bloom_uri": bloom_uri,
+                    }
+                )
+        lake_index = LakeIndex(files=files)
+
+        uri_list = find_files_by_record_id(
+            s3_client=s3_client,
+            lake_index=lake_index,
+            columns=["pk", "sk"],
+            record_id=("2024-1-7", Decimal("7")),
+        )
+        assert files[4]["uri"] in uri_list
+        assert len(uri_list) <= 2
+
+        uri_list = find_files_by_record_id(
+            s3_client=s3_client,
+            lake_index=lake_index,
+            columns=["pk", "sk"],
+            record_id=("2024-1-7", 7),
+            partition_filter={"year": "2023"},
+        )
+        assert files[4]["uri"] not in uri_list
+
+        # the loaded bloom filters are cached, no more S3 read
+        for file in files:
+            S3Path.from_s3_uri(file["bloom_uri"]).delete(bsm=s3_client)
+        uri_list = find_files_by_record_id(
+            s3_client=s3_client,
+            lake_index=lake_index,
+            columns=["pk", "sk"],
+            record_id=("2023-2-0", 0),
+        )
+        assert files[2]["uri"] in uri_list
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.bloom_filter",
+        preview=False,
+    )
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import polars as pl
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.clustering import (
+    MAX_TOTAL_BITS,
+    MAX_BITS_PER_COLUMN,
+    get_n_bit,
+    z_order_key,
+    z_order_sort,
+)
+
+
+def test_get_n_bit():
+    assert get_n_bit(n_col=2, n_row=0) == 1
+    assert get_n_bit(n_col=2, n_row=2) == 1
+    assert get_n_bit(n_col=2, n_row=4) == 2
+    assert get_n_bit(n_col=2, n_row=5) == 3
+    assert get_n_bit(n_col=1, n_row=10**9) == MAX_BITS_PER_COLUMN
+    assert get_n_bit(n_col=4, n_row=10**9) == 15
+    for n_col in range(1, MAX_TOTAL_BITS + 1):
+        for n_row in [1, 1000, 10**9]:
+            n_bit = get_n_bit(n_col=n_col, n_row=n_row)
+            assert 1 <= n_bit <= MAX_BITS_PER_COLUMN
+            assert n_col * n_bit <= MAX_TOTAL_BITS
+
+
+def test_z_order_key():
+    # 4 rows, 2 bits per column, the ranks 1 .. 4 are scaled to 0 .. 3
+    df = pl.DataFrame({"x": [10, 20, 30, 40], "y": ["d", "c", "b", "a"]})
+    # bit i of column j goes to bit 2 * i + j
+    # x = 0b00, y = 0b11 -> 0b1010
+    # x = 0b01, y = 0b10 -> 0b1001
+    # x = 0b10, y = 0b01 -> 0b0110
+    # x = 0b11, y = 0b00 -> 0b0101
+    assert z_order_key(df, ["x", "y"]).to_list() == [
+        0b1010,
+        0b1001,
+        0b0110,
+        0b0101,
+    ]
+    assert z_order_key(df, ["y", "x"]).to_list() == [
+        0b0101,
+        0b0110,
+        0b1001,
+        0b1010,
+    ]
+
+
+def test_z_order_key_bound():
+    # 9 columns, 1000 distinct values, 63 // 9 = 7 bits per column
+    n_col, n_row = 9, 1000
+    df = pl.DataFrame({f"c{j}": range(n_row) for j in range(n_col)})
+    key = z_order_key(df, df.columns)
+    assert key.dtype == pl.UInt64
+    # the last row has the max value in every column, all 63 bits are set
+    assert key.max() == 2**MAX_TOTAL_BITS - 1
+    assert key.is_sorted()
+
+
+def test_z_order_sort_single_column():
+    df = pl.DataFrame(
+        {
+            "x": [3, None, 1, 2, None, 5, 4],
+            "id": ["a", "b", "c", "d", "e", "f", "g"],
+        }
+    )
+    assert z_order_sort(df, ["x"]).equals(df.sort("x", nulls_last=False))
+    # the one column key is in the same order as the value
+    df_sorted = df.with_columns(z_order_key(df, ["x"])).sort(
+        ["_z_order_key", "id"]
+    )
+    assert df_sorted["x"].to_list() == [None, None, 1, 2, 3, 4, 5]
+
+
+def test_z_order_sort_nulls_first():
+    df = pl.DataFrame(
+        {
+            "x": [2, 1, None, 2, None, 1],
+            "y": ["b", None, "a", "a", None, "a"],
+        }
+    )
+    key = z_order_key(df, ["x", "y"]).to_list()
+    # both null is the smallest key
+    assert key[4] == 0
+    # a null sorts before any value in the same column
+    assert key[2] < key[3]
+    assert key[1] < key[5]
+    df_sorted = z_order_sort(df, ["x", "y"])
+    assert df_sorted.row(0) == (None, None)
+    assert df_sorted.height == df.height
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.clustering",
+        preview=False,
+    )
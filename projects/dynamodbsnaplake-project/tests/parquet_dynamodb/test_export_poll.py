@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+
+import moto
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.export_poll import (
+    MIN_INITIAL_WAIT_SECONDS,
+    MAX_INITIAL_WAIT_SECONDS,
+    MIN_MAX_WAIT_SECONDS,
+    MAX_MAX_WAIT_SECONDS,
+    GiB,
+    ExportPollSchedule,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def test_from_table_size():
+    # (table size, wait_seconds, max_wait_seconds)
+    cases = [
+        # small table, clamped to the lower bounds
+        (0, MIN_INITIAL_WAIT_SECONDS, MIN_MAX_WAIT_SECONDS),
+        (GiB - 1, MIN_INITIAL_WAIT_SECONDS, MIN_MAX_WAIT_SECONDS),
+        (3 * GiB, MIN_INITIAL_WAIT_SECONDS, MIN_MAX_WAIT_SECONDS),
+        # 1 second per GiB, 4 seconds per GiB
+        (10 * GiB, 10, MIN_MAX_WAIT_SECONDS),
+        (20 * GiB, 20, 80),
+        (60 * GiB, MAX_INITIAL_WAIT_SECONDS, 240),
+        # huge table, clamped to the upper bounds
+        (150 * GiB, MAX_INITIAL_WAIT_SECONDS, MAX_MAX_WAIT_SECONDS),
+        (100_000 * GiB, MAX_INITIAL_WAIT_SECONDS, MAX_MAX_WAIT_SECONDS),
+    ]
+    for table_size, wait_seconds, max_wait_seconds in cases:
+        schedule = ExportPollSchedule.from_table_size(table_size)
+        assert schedule.to_dict() == {
+            "wait_seconds": wait_seconds,
+            "max_wait_seconds": max_wait_seconds,
+        }, table_size
+
+
+def test_next():
+    schedule = ExportPollSchedule.from_table_size(20 * GiB)
+    assert list(itertools.islice(schedule.iter_wait_seconds(), 6)) == [
+        20,
+        40,
+        80,
+        80,
+        80,
+        80,
+    ]
+    # the schedule is not modified
+    assert schedule.wait_seconds == 20
+
+    # doubling stops exactly at the cap
+    schedule = ExportPollSchedule(wait_seconds=5, max_wait_seconds=60)
+    assert list(itertools.islice(schedule.iter_wait_seconds(), 6)) == [
+        5,
+        10,
+        20,
+        40,
+        60,
+        60,
+    ]
+    capped = schedule.next().next().next().next()
+    assert capped.next() == capped
+
+    for table_size in [0, 10 * GiB, 100 * GiB, 100_000 * GiB]:
+        schedule = ExportPollSchedule.from_table_size(table_size)
+        wait_seconds_list = list(itertools.islice(schedule.iter_wait_seconds(), 20))
+        assert wait_seconds_list == sorted(wait_seconds_list)
+        assert max(wait_seconds_list) == schedule.max_wait_seconds
+        assert all(
+            b == min(a * 2, schedule.max_wait_seconds)
+            for a, b in zip(wait_seconds_list, wait_seconds_list[1:])
+        )
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_dynamodb,
+    ]
+
+    def test_from_table(self):
+        self.bsm.dynamodb_client.create_table(
+            TableName="my-table",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        # moto doesn't resolve the table arn in describe_table, use the name
+        schedule = ExportPollSchedule.from_table(
+            dynamodb_client=self.bsm.dynamodb_client,
+            table_arn="my-table",
+        )
+        assert schedule == ExportPollSchedule.from_table_size(0)
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.export_poll",
+        preview=False,
+    )
@@ -0,0 +1,594 @@
+# -*- coding: utf-8 -*-
+
+import moto
+import polars as pl
+from polars_writer.api import Writer
+from dbsnaplake.api import (
+    S3Location,
+    StagingFileGroupManifestFile,
+    PartitionFileGroupManifestFile,
+    write_to_s3,
+    read_many_parquet_from_s3,
+)
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.incremental import (
+    BASE_URI_LIST,
+    BUCKET,
+    N_BUCKET,
+    get_bucket,
+    merge_changes,
+    plan_incremental_merge,
+    merge_partition_file_group_manifest_file,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.lake_index import (
+    LakeIndex,
+    new_file_record,
+    consolidate_lake_index,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.bloom_filter import write_bloom_filter
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def new_changes(rows) -> pl.DataFrame:
+    """
+    ``rows`` is a list of ``(id, value, _is_deleted, _write_timestamp_micros)``.
+    """
+    return pl.DataFrame(
+        rows,
+        schema={
+            "id": pl.Utf8,
+            "value": pl.Int64,
+            "_is_deleted": pl.Boolean,
+            "_write_timestamp_micros": pl.Int64,
+        },
+        orient="row",
+    )
+
+
+def to_dict(df: pl.DataFrame) -> dict:
+    return {row["id"]: row for row in df.to_dicts()}
+
+
+def test_merge_changes_upsert():
+    df_base = pl.DataFrame({"id": ["a", "b"], "value": [1, 2]})
+    df_changes = new_changes(
+        [
+            # update b: OldImage + NewImage with the same timestamp
+            ("b", 2, True, 10),
+            ("b", 20, False, 10),
+            # insert c
+            ("c", 3, False, 10),
+        ]
+    )
+    df = merge_changes(df_base, df_changes, record_id_columns=["id"])
+    assert df.columns == ["id", "value"]
+    assert to_dict(df) == {
+        "a": {"id": "a", "value": 1},
+        "b": {"id": "b", "value": 20},
+        "c": {"id": "c", "value": 3},
+    }
+
+    # the partition doesn't exist yet
+    df = merge_changes(None, df_changes, record_id_columns=["id"])
+    assert to_dict(df) == {
+        "b": {"id": "b", "value": 20},
+        "c": {"id": "c", "value": 3},
+    }
+
+
+def test_merge_changes_delete():
+    df_base = pl.DataFrame({"id": ["a", "b"], "value": [1, 2]})
+    df_changes = new_changes([("b", 2, True, 10)])
+    df = merge_changes(df_base, df_changes, record_id_columns=["id"])
+    assert to_dict(df) == {"a": {"id": "a", "value": 1}}
+
+    # insert then delete later, the record is gone
+    df_changes = new_changes([("c", 3, False, 10), ("c", 3, True, 20)])
+    df = merge_changes(df_base, df_changes, record_id_columns=["id"])
+    assert set(to_dict(df)) == {"a", "b"}
+
+    # delete then insert later, the record is back
+    df_changes = new_changes([("b", 2, True, 10), ("b", 30, False, 20)])
+    df = merge_changes(df_base, df_changes, record_id_columns=["id"])
+    assert to_dict(df)["b"] == {"id": "b", "value": 30}
+
+
+def test_merge_changes_same_timestamp_tie_break():
+    df_base = pl.DataFrame({"id": ["a"], "value": [1]})
+    # the NewImage row wins regardless of the row order in the export file
+    for rows in [
+        [("a", 1, True, 10), ("a", 2, False, 10)],
+        [("a", 2, False, 10), ("a", 1, True, 10)],
+    ]:
+        df = merge_changes(df_base, new_changes(rows), record_id_columns=["id"])
+        assert to_dict(df) == {"a": {"id": "a", "value": 2}}
+
+    # a later change always wins over the timestamp tie
+    rows = [
+        ("a", 2, False, 20),
+        ("a", 1, True, 10),
+        ("a", 5, False, 10),
+    ]
+    df = merge_changes(df_base, new_changes(rows), record_id_columns=["id"])
+    assert to_dict(df) == {"a": {"id": "a", "value": 2}}
+
+
+def test_merge_changes_compound_record_id():
+    df_base = pl.DataFrame({"pk": ["a", "a"], "sk": [1, 2], "value": [1, 2]})
+    df_changes = pl.DataFrame(
+        {
+            "pk": ["a", "a"],
+            "sk": [2, 3],
+            "value": [2, 3],
+            "_is_deleted": [True, False],
+            "_write_timestamp_micros": [10, 10],
+        }
+    )
+    df = merge_changes(df_base, df_changes, record_id_columns=["pk", "sk"])
+    assert sorted(df.rows()) == [("a", 1, 1), ("a", 3, 3)]
+
+
+def test_merge_changes_with_changed_ids():
+    # the change records are one bucket, the other changed ids are
+    # still removed from the base
+    df_base = pl.DataFrame({"id": ["a", "b", "c"], "value": [1, 2, 3]})
+    df_changes = new_changes([("b", 20, False, 10)])
+    df = merge_changes(
+        df_base,
+        df_changes,
+        record_id_columns=["id"],
+        df_changed_ids=pl.DataFrame({"id": ["b", "c"]}),
+    )
+    assert to_dict(df) == {
+        "a": {"id": "a", "value": 1},
+        "b": {"id": "b", "value": 20},
+    }
+
+
+def test_get_bucket():
+    df = pl.DataFrame({"pk": [f"id-{i}" for i in range(1000)], "sk": [1] * 1000})
+    buckets = get_bucket(df, ["pk"], 4)
+    assert buckets.dtype == pl.UInt32
+    assert set(buckets.to_list()) == {0, 1, 2, 3}
+    # the bucket only depends on the record id
+    assert get_bucket(df.reverse(), ["pk"], 4).to_list() == buckets.reverse().to_list()
+    assert get_bucket(df, ["pk", "sk"], 4).to_list() != buckets.to_list()
+    assert set(get_bucket(df, ["pk"], 1).to_list()) == {0}
+
+
+def test_merge_changes_schema_drift():
+    df_base = pl.DataFrame(
+        {
+            "id": ["a", "b"],
+            "value": [1, 2],
+            "old_attr": ["x", "y"],
+        }
+    )
+    # the new version of the item drops ``old_attr``, adds ``new_attr``,
+    # and stores ``value`` as float
+    df_changes = pl.DataFrame(
+        {
+            "id": ["b"],
+            "value": [2.5],
+            "new_attr": [True],
+            "_is_deleted": [False],
+            "_write_timestamp_micros": [10],
+        }
+    )
+    df = merge_changes(df_base, df_changes, record_id_columns=["id"])
+    assert set(df.columns) == {"id", "value", "old_attr", "new_attr"}
+    assert df.schema["value"] == pl.Float64
+    assert to_dict(df) == {
+        "a": {"id": "a", "value": 1.0, "old_attr": "x", "new_attr": None},
+        "b": {"id": "b", "value": 2.5, "old_attr": None, "new_attr": True},
+    }
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=cls.bucket)
+        cls.s3_loc = S3Location(
+            s3uri_staging=f"s3://{cls.bucket}/staging/",
+            s3uri_datalake=f"s3://{cls.bucket}/datalake/",
+        )
+
+    def test_merge_partition_file_group_manifest_file(self):
+        s3_client = self.bsm.s3_client
+        polars_writer = Writer(format="parquet", parquet_compression="snappy")
+        s3dir_staging_partition = self.s3_loc.s3dir_staging.joinpath(
+            "year=2024"
+        ).to_dir()
+        s3dir_datalake_partition = self.s3_loc.s3dir_datalake.joinpath(
+            "year=2024"
+        ).to_dir()
+
+        # existing datalake partition, plus a file in a sub partition
+        # that doesn't belong to it
+        s3path_base, _, _ = write_to_s3(
+            df=pl.DataFrame({"id": ["a", "b", "c"], "value": [1, 2, 3]}),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_datalake_partition,
+            fname="base",
+        )
+        s3path_other, _, _ = write_to_s3(
+            df=pl.DataFrame({"id": ["z"], "value": [0]}),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_datalake_partition.joinpath("month=01").to_dir(),
+            fname="other",
+        )
+
+        s3path_changes, size, etag = write_to_s3(
+            df=new_changes(
+                [
+                    ("b", 2, True, 10),
+                    ("b", 20, False, 10),
+                    ("c", 3, True, 10),
+                    ("d", 4, False, 10),
+                ]
+            ),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_staging_partition,
+            fname="changes",
+        )
+        manifest_file = PartitionFileGroupManifestFile.new(
+            uri=self.s3_loc.s3dir_staging.joinpath("manifest-data.parquet").uri,
+            uri_summary=self.s3_loc.s3dir_staging.joinpath(
+                "manifest-summary.json"
+            ).uri,
+            data_file_list=[
+                {
+                    "uri": s3path_changes.uri,
+                    "size": size,
+                    "n_record": 4,
+                    "etag": etag,
+                },
+            ],
+            details={"partition_uri": s3dir_staging_partition.uri},
+        )
+
+        expected = {
+            "a": {"id": "a", "value": 1},
+            "b": {"id": "b", "value": 20},
+            "d": {"id": "d", "value": 4},
+        }
+        kwargs = dict(
+            partition_file_group_manifest_file=manifest_file,
+            s3_client=s3_client,
+            s3_loc=self.s3_loc,
+            col_record_id="id",
+            polars_writer=polars_writer,
+            bloom_filter_columns=["id"],
+        )
+        s3path_new = merge_partition_file_group_manifest_file(**kwargs)
+        assert s3path_new.parent.uri == s3dir_datalake_partition.uri
+        assert s3path_new.basename.startswith(f"{manifest_file.fingerprint}.")
+        df = read_many_parquet_from_s3([s3path_new], s3_client=s3_client)
+        assert to_dict(df) == expected
+        assert s3path_base.exists(bsm=s3_client) is False
+        assert s3path_other.exists(bsm=s3_client) is True
+
+        # retry after the merged file is written but before the old files
+        # are deleted, the merged file is kept as it is
+        s3path_base, _, _ = write_to_s3(
+            df=pl.DataFrame({"id": ["x"], "value": [9]}),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_datalake_partition,
+            fname="base",
+        )
+        s3path_retry = merge_partition_file_group_manifest_file(**kwargs)
+        assert s3path_retry.uri == s3path_new.uri
+        df = read_many_parquet_from_s3([s3path_retry], s3_client=s3_client)
+        assert to_dict(df) == expected
+        assert s3path_base.exists(bsm=s3_client) is False
+        assert [
+            s3path.uri
+            for s3path in s3dir_datalake_partition.iter_objects(
+                bsm=s3_client
+            ).all()
+            if s3path.parent.uri == s3dir_datalake_partition.uri
+        ] == [s3path_new.uri]
+
+    def test_merge_partition_delete_all(self):
+        s3_client = self.bsm.s3_client
+        polars_writer = Writer(format="parquet", parquet_compression="snappy")
+        s3dir_staging_partition = self.s3_loc.s3dir_staging.joinpath(
+            "year=2025"
+        ).to_dir()
+        s3dir_datalake_partition = self.s3_loc.s3dir_datalake.joinpath(
+            "year=2025"
+        ).to_dir()
+        s3path_base, _, _ = write_to_s3(
+            df=pl.DataFrame({"id": ["a"], "value": [1]}),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_datalake_partition,
+            fname="base",
+        )
+        s3path_changes, size, etag = write_to_s3(
+            df=new_changes([("a", 1, True, 10)]),
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_staging_partition,
+            fname="changes",
+        )
+        manifest_file = PartitionFileGroupManifestFile.new(
+            uri=self.s3_loc.s3dir_staging.joinpath("manifest-data-2.parquet").uri,
+            uri_summary=self.s3_loc.s3dir_staging.joinpath(
+                "manifest-summary-2.json"
+            ).uri,
+            data_file_list=[
+                {
+                    "uri": s3path_changes.uri,
+                    "size": size,
+                    "n_record": 1,
+                    "etag": etag,
+                },
+            ],
+            details={"partition_uri": s3dir_staging_partition.uri},
+        )
+        s3path_new = merge_partition_file_group_manifest_file(
+            partition_file_group_manifest_file=manifest_file,
+            s3_client=s3_client,
+            s3_loc=self.s3_loc,
+            col_record_id="id",
+            polars_writer=polars_writer,
+        )
+        assert s3path_new is None
+        assert s3path_base.exists(bsm=s3_client) is False
+
+
+    def test_plan_and_merge_by_bucket(self):
+        s3_client = self.bsm.s3_client
+        polars_writer = Writer(format="parquet", parquet_compression="snappy")
+        s3_loc = S3Location(
+            s3uri_staging=f"s3://{self.bucket}/bucket/staging/",
+            s3uri_datalake=f"s3://{self.bucket}/bucket/datalake/",
+        )
+        s3dir_datalake_partition = s3_loc.s3dir_datalake.joinpath(
+            "year=2024"
+        ).to_dir()
+
+        # three existing files with bloom filters, and the lake index
+        file_record_list = list()
+        for prefix in ["a", "b", "c"]:
+            df = pl.DataFrame(
+                {
+                    "id": [f"{prefix}{i}" for i in range(20)],
+                    "value": list(range(20)),
+                }
+            )
+            s3path, size, _ = write_to_s3(
+                df=df,
+                s3_client=s3_client,
+                polars_writer=polars_writer,
+                s3dir=s3dir_datalake_partition,
+                fname=f"base-{prefix}",
+            )
+            bloom_uri = write_bloom_filter(
+                s3_client=s3_client,
+                s3_loc=s3_loc,
+                df=df,
+                s3path_data=s3path,
+                columns=["id"],
+            ).uri
+            file_record_list.append(
+                new_file_record(
+                    df=df,
+                    s3path=s3path,
+                    size=size,
+                    s3_loc=s3_loc,
+                    bloom_uri=bloom_uri,
+                )
+            )
+        LakeIndex(files=file_record_list).write(s3_client=s3_client, s3_loc=s3_loc)
+        base_uri_list = [file["uri"] for file in file_record_list]
+        target_size = min(file["size"] for file in file_record_list)
+
+        # update a1, delete b2, insert x and y
+        df_changes = new_changes(
+            [
+                ("a1", 1, True, 10),
+                ("a1", 100, False, 10),
+                ("b2", 2, True, 10),
+                ("x", 7, False, 10),
+                ("y", 8, False, 10),
+            ]
+        )
+        s3path_changes, size, etag = write_to_s3(
+            df=df_changes,
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3_loc.s3dir_staging_datalake.joinpath("year=2024").to_dir(),
+            fname="changes",
+        )
+        StagingFileGroupManifestFile.new(
+            uri=s3_loc.s3dir_staging_file_group_manifest_data.joinpath(
+                "manifest-data-1.parquet"
+            ).uri,
+            uri_summary=s3_loc.s3dir_staging_file_group_manifest_summary.joinpath(
+                "manifest-summary-1.json"
+            ).uri,
+            data_file_list=[
+                {
+                    "uri": s3path_changes.uri,
+                    "size": size,
+                    "n_record": df_changes.shape[0],
+                    "etag": etag,
+                },
+            ],
+        ).write(s3_client=s3_client)
+
+        manifest_file_list = plan_incremental_merge(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            target_size=target_size,
+        )
+        # one bucket per existing file, plus the buckets for the changes
+        n_bucket = len(manifest_file_list)
+        assert n_bucket >= 4
+        assert [
+            manifest_file.details[BUCKET] for manifest_file in manifest_file_list
+        ] == list(range(n_bucket))
+        assert {
+            manifest_file.details[N_BUCKET] for manifest_file in manifest_file_list
+        } == {n_bucket}
+        # every existing file is in exactly one bucket
+        assert sorted(
+            uri
+            for manifest_file in manifest_file_list
+            for uri in manifest_file.details[BASE_URI_LIST]
+        ) == sorted(base_uri_list)
+        assert [
+            len(manifest_file.details[BASE_URI_LIST])
+            for manifest_file in manifest_file_list
+        ] == [1, 1, 1] + [0] * (n_bucket - 3)
+        for manifest_file in manifest_file_list:
+            assert manifest_file.data_file_list == manifest_file_list[0].data_file_list
+
+        # the expected rewritten files: the ones with a changed record id,
+        # and the buckets that have a record to upsert
+        df_upsert = pl.DataFrame({"id": ["a1", "x", "y"]})
+        upsert_buckets = set(get_bucket(df_upsert, ["id"], n_bucket).to_list())
+        rewritten_base_uris = set()
+        for manifest_file in manifest_file_list:
+            base_uris = manifest_file.details[BASE_URI_LIST]
+            if manifest_file.details[BUCKET] in upsert_buckets or any(
+                uri.endswith(("base-a.snappy.parquet", "base-b.snappy.parquet"))
+                for uri in base_uris
+            ):
+                rewritten_base_uris.update(base_uris)
+        kept_base_uris = set(base_uri_list).difference(rewritten_base_uris)
+
+        for _ in range(2):  # the retry doesn't change anything
+            for manifest_file in manifest_file_list:
+                merge_partition_file_group_manifest_file(
+                    partition_file_group_manifest_file=manifest_file,
+                    s3_client=s3_client,
+                    s3_loc=s3_loc,
+                    col_record_id="id",
+                    polars_writer=polars_writer,
+                    bloom_filter_columns=["id"],
+                )
+            s3path_list = [
+                s3path
+                for s3path in s3dir_datalake_partition.iter_objects(
+                    bsm=s3_client
+                ).all()
+                if s3path.parent.uri == s3dir_datalake_partition.uri
+            ]
+            uris = {s3path.uri for s3path in s3path_list}
+            assert kept_base_uris.issubset(uris)
+            assert len(rewritten_base_uris.intersection(uris)) == 0
+            df = read_many_parquet_from_s3(s3path_list, s3_client=s3_client)
+            assert df.shape[0] == 60 - 1 + 2
+            data = to_dict(df)
+            assert data["a1"]["value"] == 100
+            assert "b2" not in data
+            assert data["x"]["value"] == 7
+            assert data["y"]["value"] == 8
+
+        lake_index = consolidate_lake_index(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            incremental=True,
+        )
+        assert {file["uri"] for file in lake_index.files} == uris
+        assert lake_index.n_record == 61
+
+    def test_merge_skips_untouched_file_group(self):
+        s3_client = self.bsm.s3_client
+        polars_writer = Writer(format="parquet", parquet_compression="snappy")
+        s3dir_staging_partition = self.s3_loc.s3dir_staging.joinpath(
+            "year=2026"
+        ).to_dir()
+        s3dir_datalake_partition = self.s3_loc.s3dir_datalake.joinpath(
+            "year=2026"
+        ).to_dir()
+        df_base = pl.DataFrame({"id": ["a", "b"], "value": [1, 2]})
+        s3path_base, _, _ = write_to_s3(
+            df=df_base,
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_datalake_partition,
+            fname="base",
+        )
+        write_bloom_filter(
+            s3_client=s3_client,
+            s3_loc=self.s3_loc,
+            df=df_base,
+            s3path_data=s3path_base,
+            columns=["id"],
+        )
+        df_changes = new_changes([("x", 7, False, 10), ("y", 8, True, 10)])
+        s3path_changes, size, etag = write_to_s3(
+            df=df_changes,
+            s3_client=s3_client,
+            polars_writer=polars_writer,
+            s3dir=s3dir_staging_partition,
+            fname="changes",
+        )
+        # the upsert of x goes to the other bucket
+        n_bucket = 2
+        bucket = 1 - get_bucket(pl.DataFrame({"id": ["x"]}), ["id"], n_bucket)[0]
+        manifest_file = PartitionFileGroupManifestFile.new(
+            uri=self.s3_loc.s3dir_staging.joinpath("manifest-data-3.parquet").uri,
+            uri_summary=self.s3_loc.s3dir_staging.joinpath(
+                "manifest-summary-3.json"
+            ).uri,
+            data_file_list=[
+                {
+                    "uri": s3path_changes.uri,
+                    "size": size,
+                    "n_record": 2,
+                    "etag": etag,
+                },
+            ],
+            details={
+                "partition_uri": s3dir_staging_partition.uri,
+                BASE_URI_LIST: [s3path_base.uri],
+                BUCKET: bucket,
+                N_BUCKET: n_bucket,
+            },
+        )
+        kwargs = dict(
+            partition_file_group_manifest_file=manifest_file,
+            s3_client=s3_client,
+            s3_loc=self.s3_loc,
+            col_record_id="id",
+            polars_writer=polars_writer,
+        )
+        # the bloom filter says no changed record is in the file
+        assert (
+            merge_partition_file_group_manifest_file(
+                bloom_filter_columns=["id"], **kwargs
+            )
+            is None
+        )
+        assert s3path_base.exists(bsm=s3_client) is True
+        # without bloom filter, the file is read but not rewritten
+        assert merge_partition_file_group_manifest_file(**kwargs) is None
+        assert s3path_base.exists(bsm=s3_client) is True
+        assert [
+            s3path.uri
+            for s3path in s3dir_datalake_partition.iter_objects(bsm=s3_client).all()
+        ] == [s3path_base.uri]
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.incremental",
+        preview=False,
+    )
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import moto
+import polars as pl
+from s3pathlib import S3Path
+from dbsnaplake.api import S3Location
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.lake_index import (
+    get_column_stats,
+    new_file_record,
+    write_lake_index_fragment,
+    LakeIndex,
+    consolidate_lake_index,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+bucket = "my-bucket"
+
+
+def new_s3_loc(prefix: str) -> S3Location:
+    return S3Location(
+        s3uri_staging=f"s3://{bucket}/{prefix}/staging/",
+        s3uri_datalake=f"s3://{bucket}/{prefix}/datalake/",
+    )
+
+
+def new_record(s3_loc: S3Location, relpath: str, df: pl.DataFrame) -> dict:
+    s3path = s3_loc.s3dir_datalake.joinpath(relpath)
+    return new_file_record(df=df, s3path=s3path, size=1000, s3_loc=s3_loc)
+
+
+def test_get_column_stats():
+    df = pl.DataFrame(
+        {
+            "id": ["b", "a", "c"],
+            "amount": [3, None, 1],
+            "day": [date(2024, 1, 2), date(2024, 1, 1), date(2024, 1, 3)],
+            "tags": [["x"], [], None],
+            "empty": [None, None, None],
+        }
+    )
+    assert get_column_stats(df) == {
+        "id": {"min": "a", "max": "c"},
+        "amount": {"min": 1, "max": 3},
+        "day": {"min": "2024-01-01", "max": "2024-01-03"},
+    }
+    assert get_column_stats(df.head(0)) == {}
+
+
+def test_select():
+    s3_loc = new_s3_loc("select")
+    df_amount_low = pl.DataFrame({"amount": [1, 5], "day": [date(2024, 1, 1)] * 2})
+    df_amount_high = pl.DataFrame({"amount": [10, 20], "day": [date(2024, 2, 1)] * 2})
+    df_amount_null = pl.DataFrame({"amount": [None, None]}, schema={"amount": pl.Int64})
+    df_no_amount = pl.DataFrame({"other": ["a"]})
+    records = [
+        new_record(s3_loc, "year=2023/month=01/f1.parquet", df_amount_low),
+        new_record(s3_loc, "year=2024/month=01/f2.parquet", df_amount_low),
+        new_record(s3_loc, "year=2024/month=02/f3.parquet", df_amount_high),
+        new_record(s3_loc, "year=2024/month=03/f4.parquet", df_amount_null),
+        new_record(s3_loc, "year=2024/month=03/f5.parquet", df_no_amount),
+    ]
+    assert records[0]["partition"] == {"year": "2023", "month": "01"}
+    assert records[0]["partition_uri"] == s3_loc.s3dir_datalake.joinpath(
+        "year=2023/month=01/"
+    ).uri
+    lake_index = LakeIndex(files=records)
+    assert lake_index.n_record == 9
+
+    def select(**kwargs):
+        return [
+            S3Path(uri).basename.split(".")[0] for uri in lake_index.select(**kwargs)
+        ]
+
+    assert select() == ["f1", "f2", "f3", "f4", "f5"]
+
+    # partition pruning
+    assert select(partition_filter={"year": "2023"}) == ["f1"]
+    assert select(partition_filter={"year": "2024", "month": ["01", "03"]}) == [
+        "f2",
+        "f4",
+        "f5",
+    ]
+    assert select(partition_filter={"year": ["2025"]}) == []
+    # the partition key not in the file is ignored
+    assert select(partition_filter={"region": "us"}) == select()
+
+    # column range pruning, the bounds are inclusive, the all null column
+    # and the column without stats cannot be pruned
+    assert select(column_ranges={"amount": (6, None)}) == ["f3", "f4", "f5"]
+    assert select(column_ranges={"amount": (None, 5)}) == ["f1", "f2", "f4", "f5"]
+    assert select(column_ranges={"amount": (6, 9)}) == ["f4", "f5"]
+    assert select(column_ranges={"amount": (20, 20)}) == ["f3", "f4", "f5"]
+    assert select(column_ranges={"day": ("2024-01-15", None)}) == ["f3", "f4", "f5"]
+    # incomparable bound cannot prune
+    assert select(column_ranges={"amount": ("a", None)}) == select()
+
+    # both
+    assert select(
+        partition_filter={"year": "2024"},
+        column_ranges={"amount": (None, 5), "day": ("2024-01-01", "2024-01-01")},
+    ) == ["f2", "f4", "f5"]
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=bucket)
+
+    def test_consolidate_lake_index(self):
+        s3_client = self.bsm.s3_client
+        s3_loc = new_s3_loc("consolidate")
+        df = pl.DataFrame({"id": ["a"]})
+
+        def uris(lake_index: LakeIndex):
+            return [
+                file["uri"].replace(s3_loc.s3dir_datalake.uri, "")
+                for file in lake_index.files
+            ]
+
+        # the existing lake index
+        LakeIndex(
+            files=[
+                new_record(s3_loc, "year=2022/f0.parquet", df),
+                new_record(s3_loc, "year=2023/f1.parquet", df),
+                new_record(s3_loc, "year=2023/f2.parquet", df),
+                new_record(s3_loc, "year=2024/f3.parquet", df),
+                new_record(s3_loc, "year=2024/f4.parquet", df),
+            ]
+        ).write(s3_client=s3_client, s3_loc=s3_loc)
+
+        def s3dir_partition(year: str) -> S3Path:
+            return s3_loc.s3dir_datalake.joinpath(f"year={year}").to_dir()
+
+        # year=2023, f1 is replaced by f5, f2 is untouched
+        write_lake_index_fragment(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            fname="fragment-1",
+            s3dir_partition=s3dir_partition("2023"),
+            file_record_list=[new_record(s3_loc, "year=2023/f5.parquet", df)],
+            replaced_uri_list=[s3dir_partition("2023").joinpath("f1.parquet").uri],
+        )
+        # year=2024, the whole partition is replaced by f6
+        write_lake_index_fragment(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            fname="fragment-2",
+            s3dir_partition=s3dir_partition("2024"),
+            file_record_list=[new_record(s3_loc, "year=2024/f6.parquet", df)],
+        )
+        # year=2022, f0 is rewritten in place, it is not listed twice
+        write_lake_index_fragment(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            fname="fragment-3",
+            s3dir_partition=s3dir_partition("2022"),
+            file_record_list=[new_record(s3_loc, "year=2022/f0.parquet", df)],
+            replaced_uri_list=[],
+        )
+
+        lake_index = consolidate_lake_index(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            incremental=True,
+        )
+        assert uris(lake_index) == [
+            "year=2022/f0.parquet",
+            "year=2023/f2.parquet",
+            "year=2023/f5.parquet",
+            "year=2024/f6.parquet",
+        ]
+        assert (
+            LakeIndex.read(s3_client=s3_client, s3_loc=s3_loc).files
+            == lake_index.files
+        )
+
+        # full mode only has the files of this run
+        lake_index = consolidate_lake_index(
+            s3_client=s3_client,
+            s3_loc=s3_loc,
+            incremental=False,
+        )
+        assert uris(lake_index) == [
+            "year=2022/f0.parquet",
+            "year=2023/f5.parquet",
+            "year=2024/f6.parquet",
+        ]
+
+    def test_read_not_exists(self):
+        s3_loc = new_s3_loc("not-exists")
+        assert LakeIndex.read(s3_client=self.bsm.s3_client, s3_loc=s3_loc) is None
+        # incremental mode without an existing lake index
+        lake_index = consolidate_lake_index(
+            s3_client=self.bsm.s3_client,
+            s3_loc=s3_loc,
+            incremental=True,
+        )
+        assert lake_index.files == []
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.lake_index",
+        preview=False,
+    )
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+import moto
+import pytest
+
+from dynamodbsnaplake.vendor.parquet_dynamodb import local_runner
+from dynamodbsnaplake.vendor.parquet_dynamodb.constants import RequestTypeEnum
+from dynamodbsnaplake.vendor.parquet_dynamodb.sfn_def import (
+    make_state_machine_definition,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.local_runner import (
+    StatesError,
+    StateTiming,
+    LocalRunner,
+    get_path,
+    resolve_parameters,
+    call_intrinsic_function,
+    match_choice_rule,
+    get_default_function_names,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+data = {"a": {"b": 1, "c": [1, 2]}, "name": "alice"}
+context = {"Execution": {"Id": "exec-1", "Input": {"x": 10}}}
+
+
+def test_get_path():
+    assert get_path(data, "$", context) == data
+    assert get_path(data, "$.a.b", context) == 1
+    assert get_path(data, "$.a.c", context) == [1, 2]
+    assert get_path(data, "$$.Execution.Id", context) == "exec-1"
+    assert get_path(data, "$$.Execution.Input.x", context) == 10
+    with pytest.raises(KeyError):
+        get_path(data, "$.a.d", context)
+
+
+def test_call_intrinsic_function():
+    assert call_intrinsic_function("States.MathAdd($.a.b, 2)", data, context) == 3
+    assert (
+        call_intrinsic_function(
+            "States.MathAdd($$.Execution.Input.x, $$.Execution.Input.x)",
+            data,
+            context,
+        )
+        == 20
+    )
+    assert call_intrinsic_function("States.MathAdd(-1, 1.5)", data, context) == 0.5
+
+
+def test_resolve_parameters():
+    parameters = {
+        "static": "value",
+        "b.$": "$.a.b",
+        "exec_arn.$": "$$.Execution.Id",
+        "sum.$": "States.MathAdd($.a.b, $$.Execution.Input.x)",
+        "nested": {"name.$": "$.name", "list": [{"x.$": "$$.Execution.Input.x"}, 1]},
+    }
+    assert resolve_parameters(parameters, data, context) == {
+        "static": "value",
+        "b": 1,
+        "exec_arn": "exec-1",
+        "sum": 11,
+        "nested": {"name": "alice", "list": [{"x": 10}, 1]},
+    }
+    assert resolve_parameters("value", data, context) == "value"
+
+
+def test_match_choice_rule():
+    def match(rule: dict) -> bool:
+        return match_choice_rule(rule, data, context)
+
+    assert match({"Variable": "$.name", "StringEquals": "alice"}) is True
+    assert match({"Variable": "$.name", "StringEquals": "bob"}) is False
+    assert match({"Variable": "$.a.b", "NumericGreaterThan": 0}) is True
+    assert match({"Variable": "$.a.b", "NumericLessThan": 1}) is False
+    assert match({"Variable": "$.a.b", "NumericLessThanEquals": 1}) is True
+    assert (
+        match({"Variable": "$.a.b", "NumericGreaterThanPath": "$$.Execution.Input.x"})
+        is False
+    )
+    assert (
+        match({"Variable": "$$.Execution.Input.x", "NumericGreaterThanPath": "$.a.b"})
+        is True
+    )
+    # a missing variable never matches a comparison
+    assert match({"Variable": "$.missing", "StringEquals": "alice"}) is False
+    assert match({"Variable": "$.missing", "IsPresent": False}) is True
+    assert match({"Variable": "$.name", "IsPresent": True}) is True
+    assert (
+        match(
+            {
+                "And": [
+                    {"Variable": "$.name", "StringEquals": "alice"},
+                    {"Not": {"Variable": "$.a.b", "NumericEquals": 2}},
+                ]
+            }
+        )
+        is True
+    )
+    assert (
+        match(
+            {
+                "Or": [
+                    {"Variable": "$.name", "StringEquals": "bob"},
+                    {"Variable": "$.a.b", "NumericEquals": 2},
+                ]
+            }
+        )
+        is False
+    )
+
+
+def test_run_map():
+    runner = LocalRunner(max_workers=8, executor="thread")
+    state = {
+        "Type": "Map",
+        "ItemsPath": "$.items",
+        "ItemSelector": {
+            "index.$": "$$.Map.Item.Index",
+            "value.$": "$$.Map.Item.Value",
+            "exec_arn.$": "$$.Execution.Id",
+        },
+        "MaxConcurrency": 2,
+        "ItemProcessor": {
+            "ProcessorConfig": {"Mode": "INLINE"},
+            "StartAt": "Double",
+            "States": {
+                "Double": {
+                    "Type": "Pass",
+                    "Parameters": {
+                        "index.$": "$.index",
+                        "value.$": "States.MathAdd($.value, $.value)",
+                        "exec_arn.$": "$.exec_arn",
+                    },
+                    "End": True,
+                },
+            },
+        },
+    }
+    timing = StateTiming(name="Map", type="Map", elapsed=0)
+    result = runner._run_map(state, {"items": [1, 2, 3]}, context, timing)
+    assert result == [
+        {"index": 0, "value": 2, "exec_arn": "exec-1"},
+        {"index": 1, "value": 4, "exec_arn": "exec-1"},
+        {"index": 2, "value": 6, "exec_arn": "exec-1"},
+    ]
+    assert timing.n_items == 3
+    assert len(timing.item_elapsed_list) == 3
+
+    timing = StateTiming(name="Map", type="Map", elapsed=0)
+    assert runner._run_map(state, {"items": []}, context, timing) == []
+    assert timing.n_items == 0
+
+
+def test_run_wait(monkeypatch):
+    sleeps = list()
+    monkeypatch.setattr(local_runner.time, "sleep", sleeps.append)
+
+    runner = LocalRunner(wait_scale=0.5)
+    runner._run_wait({"Type": "Wait", "Seconds": 10}, {}, context)
+    runner._run_wait({"Type": "Wait", "SecondsPath": "$.wait"}, {"wait": 4}, context)
+    runner._run_wait(
+        {"Type": "Wait", "SecondsPath": "$$.Execution.Input.x"}, {}, context
+    )
+    assert sleeps == [5, 2, 5]
+
+    # wait_scale = 0 means no wait
+    runner = LocalRunner(wait_scale=0)
+    runner._run_wait({"Type": "Wait", "Seconds": 10}, {}, context)
+    assert sleeps == [5, 2, 5]
+
+
+bucket = "my-bucket"
+exec_arn = "arn:aws:states:us-east-1:111122223333:execution:local:run-1"
+export_arn = "arn:aws:dynamodb:us-east-1:111122223333:table/t1/export/e1"
+
+
+class StubRequest:
+    """
+    Stand in for a :class:`~parquet_dynamodb.lbd.Request` class, it records
+    the events and returns ``func(event)``.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.events = list()
+        self.lock = threading.Lock()
+
+    def lambda_handler(self, event: dict, context):
+        with self.lock:
+            self.events.append(event)
+        return self.func(event)
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=bucket)
+
+    def write_worker_payload(self, key: str, items: list) -> dict:
+        self.bsm.s3_client.put_object(Bucket=bucket, Key=key, Body=json.dumps(items))
+        return {"map_payload_bucket": bucket, "map_payload_key": key}
+
+    def make_function_mapping(self):
+        step5_items = [{"file_group": i} for i in range(5)]
+        step7_items = [{"partition": i} for i in range(3)]
+        function_mapping = {
+            # fmt: off
+            RequestTypeEnum.step1_check_and_setup_prerequisites.value: StubRequest(lambda event: {}),
+            RequestTypeEnum.step2_run_dynamodb_export_job.value: StubRequest(
+                lambda event: {
+                    "ExportDescription": {"ExportArn": export_arn},
+                    "ExportPoll": {"wait_seconds": 1, "max_wait_seconds": 3},
+                }
+            ),
+            RequestTypeEnum.step3_run_etl_job_planner.value: StubRequest(lambda event: {}),
+            RequestTypeEnum.step4_generate_many_db_snapshot_file_group_manifest_and_dispatch_to_workers.value: StubRequest(
+                lambda event: self.write_worker_payload("step5.json", step5_items)
+            ),
+            RequestTypeEnum.step5_process_db_snapshot_file_group_manifest.value: StubRequest(
+                lambda event: {"done": event["file_group"]}
+            ),
+            RequestTypeEnum.step6_generate_partition_file_group_manifest_and_dispatch_to_workers.value: StubRequest(
+                lambda event: self.write_worker_payload("step7.json", step7_items)
+            ),
+            RequestTypeEnum.step7_process_partition_file_group_manifest.value: StubRequest(
+                lambda event: {"done": event["partition"]}
+            ),
+            RequestTypeEnum.step8_validate_results.value: StubRequest(lambda event: {"valid": True}),
+            # fmt: on
+        }
+        return function_mapping
+
+    def test_run(self):
+        function_mapping = self.make_function_mapping()
+        export_status_list = ["IN_PROGRESS", "IN_PROGRESS", "IN_PROGRESS", "COMPLETED"]
+        describe_export_calls = list()
+
+        def describe_export(parameters: dict) -> dict:
+            describe_export_calls.append(parameters)
+            status = export_status_list[len(describe_export_calls) - 1]
+            return {"ExportDescription": {"ExportArn": export_arn, "ExportStatus": status}}
+
+        runner = LocalRunner(
+            bsm=self.bsm,
+            function_mapping=function_mapping,
+            aws_sdk_handlers={"dynamodb:describeExport": describe_export},
+            max_workers=4,
+            executor="thread",
+            wait_scale=0,
+        )
+        sfn_input_data = {"table_arn": "t1"}
+        result = runner.run(
+            definition=make_state_machine_definition(
+                function_names=get_default_function_names(),
+            ),
+            exec_arn=exec_arn,
+            sfn_input_data=sfn_input_data,
+        )
+        assert result.output == {"valid": True}
+        assert describe_export_calls == [{"ExportArn": export_arn}] * 4
+
+        # every Lambda gets the execution payload, the workers get the item
+        for request_type in [
+            RequestTypeEnum.step1_check_and_setup_prerequisites,
+            RequestTypeEnum.step2_run_dynamodb_export_job,
+            RequestTypeEnum.step3_run_etl_job_planner,
+            RequestTypeEnum.step4_generate_many_db_snapshot_file_group_manifest_and_dispatch_to_workers,
+            RequestTypeEnum.step6_generate_partition_file_group_manifest_and_dispatch_to_workers,
+            RequestTypeEnum.step8_validate_results,
+        ]:
+            assert function_mapping[request_type.value].events == [
+                {"exec_arn": exec_arn, "sfn_input": sfn_input_data}
+            ]
+        step5_events = function_mapping[
+            RequestTypeEnum.step5_process_db_snapshot_file_group_manifest.value
+        ].events
+        assert sorted(event["file_group"] for event in step5_events) == list(range(5))
+        step7_events = function_mapping[
+            RequestTypeEnum.step7_process_partition_file_group_manifest.value
+        ].events
+        assert sorted(event["partition"] for event in step7_events) == list(range(3))
+
+        names = [timing.name for timing in result.timings]
+        # the poll interval 1 -> 2 -> 4 (capped to 3) -> 6 (capped to 3)
+        assert names.count("Wait Before Next Poll") == 3
+        assert names.count("Double Poll Interval") == 3
+        assert names.count("Cap Poll Interval") == 2
+        assert names[-1] == "Step 8 - Validate Results"
+        timings = {timing.name: timing for timing in result.timings}
+        assert (
+            timings["Dispatch DB Snapshot File Group Manifest to Workers"].n_items == 5
+        )
+        assert timings["Dispatch Partition File Group Manifest to Workers"].n_items == 3
+        assert "total" in result.report()
+
+    def test_run_failed_export(self):
+        runner = LocalRunner(
+            bsm=self.bsm,
+            function_mapping=self.make_function_mapping(),
+            aws_sdk_handlers={
+                "dynamodb:describeExport": lambda parameters: {
+                    "ExportDescription": {"ExportStatus": "FAILED"}
+                }
+            },
+            executor="thread",
+            wait_scale=0,
+        )
+        with pytest.raises(StatesError):
+            runner.run(
+                definition=make_state_machine_definition(
+                    function_names=get_default_function_names(),
+                ),
+                exec_arn=exec_arn,
+                sfn_input_data={},
+            )
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.local_runner",
+        preview=False,
+    )
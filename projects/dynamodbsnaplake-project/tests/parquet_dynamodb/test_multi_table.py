@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import moto
+import pytest
+from s3pathlib import S3Path
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.constants import RequestTypeEnum
+from dynamodbsnaplake.vendor.parquet_dynamodb.sfn_input import SfnInput
+from dynamodbsnaplake.vendor.parquet_dynamodb.sfn_def import (
+    MAP_ITEM_PAYLOAD,
+    EXECUTION_PAYLOAD,
+    make_multi_table_state_machine_definition,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.multi_table import (
+    MultiTableSfnInput,
+    is_multi_table_input,
+    interleave,
+    merge_worker_payload,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+bucket = "my-bucket"
+
+
+def new_sfn_input(table_name: str, export_time: str = "2024-01-01T00:00:00+00:00"):
+    return SfnInput(
+        table_arn=f"arn:aws:dynamodb:us-east-1:111122223333:table/{table_name}",
+        export_time=export_time,
+        s3uri_staging_dir=f"s3://{bucket}/staging/",
+        s3uri_database_dir=f"s3://{bucket}/database/",
+    )
+
+
+def test_interleave():
+    assert interleave([]) == []
+    assert interleave([[], []]) == []
+    assert interleave([["a1", "a2", "a3"], ["b1"]]) == ["a1", "b1", "a2", "a3"]
+    assert interleave([["a1"], [], ["c1", "c2"], ["d1", "d2", "d3"]]) == [
+        "a1",
+        "c1",
+        "d1",
+        "c2",
+        "d2",
+        "d3",
+    ]
+
+
+def test_multi_table_sfn_input():
+    sfn_input_1 = new_sfn_input("t1")
+    sfn_input_2 = new_sfn_input("t2")
+    multi_table_sfn_input = MultiTableSfnInput.from_sfn_inputs(
+        [sfn_input_1, sfn_input_2]
+    )
+    data = multi_table_sfn_input.to_dict()
+    assert is_multi_table_input(data) is True
+    assert is_multi_table_input(sfn_input_1.to_dict()) is False
+    multi_table_sfn_input = MultiTableSfnInput.from_dict(json.loads(json.dumps(data)))
+    assert [
+        sfn_input.table_name for sfn_input in multi_table_sfn_input.sfn_input_list
+    ] == ["t1", "t2"]
+    # the shared worker payloads are in the staging folder of the first table
+    s3dir = multi_table_sfn_input.s3dir_multi_table
+    assert s3dir.uri.startswith(sfn_input_1._s3dir_staging.uri)
+    assert (
+        multi_table_sfn_input.s3path_snapshot_to_staging_worker_payload.parent.uri
+        == s3dir.uri
+    )
+    assert (
+        multi_table_sfn_input.s3path_staging_to_datalake_worker_payload.parent.uri
+        == s3dir.uri
+    )
+
+    # the same table at another export time is another snapshot
+    MultiTableSfnInput.from_sfn_inputs(
+        [sfn_input_1, new_sfn_input("t1", "2024-01-02T00:00:00+00:00")]
+    )
+
+    with pytest.raises(ValueError, match="cannot be empty"):
+        MultiTableSfnInput(tables=[])
+    with pytest.raises(ValueError, match="duplicate table snapshot"):
+        MultiTableSfnInput.from_sfn_inputs([sfn_input_1, sfn_input_2, sfn_input_1])
+
+
+def test_make_multi_table_state_machine_definition():
+    function_names = {
+        request_type.value: f"{request_type.value}-function"
+        for request_type in RequestTypeEnum
+    }
+    definition = make_multi_table_state_machine_definition(
+        function_names=function_names,
+        map_max_concurrency=50,
+        table_max_concurrency=5,
+    )
+    json.dumps(definition)
+    states = definition["States"]
+    assert definition["StartAt"] == "Per Table - Export and Plan"
+
+    # the per table inline Map states
+    for name in [
+        "Per Table - Export and Plan",
+        "Per Table - Plan Staging to Datalake",
+        "Per Table - Validate Results",
+    ]:
+        state = states[name]
+        assert state["Type"] == "Map"
+        assert state["ItemProcessor"]["ProcessorConfig"] == {"Mode": "INLINE"}
+        assert state["ItemsPath"] == "$$.Execution.Input.tables"
+        assert state["ItemSelector"] == {
+            "exec_arn.$": "$$.Execution.Id",
+            "sfn_input.$": "$$.Map.Item.Value",
+        }
+        assert state["MaxConcurrency"] == 5
+        for sub_state in state["ItemProcessor"]["States"].values():
+            if sub_state.get("Resource") == "arn:aws:states:::lambda:invoke":
+                assert sub_state["Parameters"]["Payload"] == MAP_ITEM_PAYLOAD
+    # the planners run per table, then the payloads are merged
+    export_states = states["Per Table - Export and Plan"]["ItemProcessor"]["States"]
+    assert (
+        export_states["Step 3 - Run ETL Job Planner"]["Next"]
+        == "Step 4 - Generate Many DB Snapshot File Group Manifest"
+    )
+    step4_plan = export_states["Step 4 - Generate Many DB Snapshot File Group Manifest"]
+    assert step4_plan["End"] is True
+    assert step4_plan["Parameters"]["FunctionName"] == function_names[
+        RequestTypeEnum.step4_generate_many_db_snapshot_file_group_manifest_and_dispatch_to_workers.value
+    ]
+    for name, request_type in [
+        (
+            "Step 4 - Merge Worker Payloads",
+            RequestTypeEnum.step4_generate_many_db_snapshot_file_group_manifest_and_dispatch_to_workers,
+        ),
+        (
+            "Step 6 - Merge Worker Payloads",
+            RequestTypeEnum.step6_generate_partition_file_group_manifest_and_dispatch_to_workers,
+        ),
+    ]:
+        state = states[name]
+        assert state["Parameters"]["Payload"] == EXECUTION_PAYLOAD
+        assert state["Parameters"]["FunctionName"] == function_names[request_type.value]
+
+    # the shared distributed worker Map states
+    for name, next_state in [
+        (
+            "Dispatch DB Snapshot File Group Manifest to Workers",
+            "Per Table - Plan Staging to Datalake",
+        ),
+        (
+            "Dispatch Partition File Group Manifest to Workers",
+            "Per Table - Validate Results",
+        ),
+    ]:
+        state = states[name]
+        assert state["ItemProcessor"]["ProcessorConfig"]["Mode"] == "DISTRIBUTED"
+        assert state["MaxConcurrency"] == 50
+        assert state["Next"] == next_state
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=bucket)
+
+    def test_merge_worker_payload(self):
+        s3_client = self.bsm.s3_client
+        multi_table_sfn_input = MultiTableSfnInput.from_sfn_inputs(
+            [new_sfn_input("t1"), new_sfn_input("t2"), new_sfn_input("t3")]
+        )
+        s3path_list = list()
+        for sfn_input, n_item in zip(multi_table_sfn_input.sfn_input_list, [3, 1, 0]):
+            s3path = sfn_input.s3path_snapshot_to_staging_worker_payload
+            s3path.write_text(
+                json.dumps(
+                    [
+                        {"sfn_input": sfn_input.to_dict(), "uri_summary": f"{i}"}
+                        for i in range(n_item)
+                    ]
+                ),
+                bsm=s3_client,
+            )
+            s3path_list.append(s3path)
+
+        s3path = multi_table_sfn_input.s3path_snapshot_to_staging_worker_payload
+        payload = merge_worker_payload(
+            s3_client=s3_client,
+            s3path_list=s3path_list,
+            s3path=s3path,
+        )
+        assert [
+            (item["sfn_input"]["table_arn"].split("/")[-1], item["uri_summary"])
+            for item in payload
+        ] == [("t1", "0"), ("t2", "0"), ("t1", "1"), ("t1", "2")]
+        assert json.loads(S3Path(s3path).read_text(bsm=s3_client)) == payload
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.multi_table",
+        preview=False,
+    )
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import moto
+import polars as pl
+import pytest
+from s3pathlib import S3Path
+
+from dynamodbsnaplake.vendor.parquet_dynamodb import parquet_footer
+from dynamodbsnaplake.vendor.parquet_dynamodb.parquet_footer import (
+    FOOTER_TAIL_SIZE,
+    _CT_STRUCT,
+    ParquetFooterError,
+    _CompactReader,
+    parse_num_rows,
+    extract_file_metadata,
+    get_parquet_num_rows_from_s3,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def write_parquet(df: pl.DataFrame, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    df.write_parquet(buffer, **kwargs)
+    return buffer.getvalue()
+
+
+def new_wide_df(n_row: int, n_col: int) -> pl.DataFrame:
+    return pl.DataFrame(
+        {
+            f"a_long_column_name_to_make_the_footer_bigger_{i}": range(n_row)
+            for i in range(n_col)
+        }
+    )
+
+
+# (df, write_parquet kwargs)
+cases = [
+    # one row group
+    (pl.DataFrame({"id": ["a", "b", "c"], "value": [1, 2, None]}), {}),
+    # empty file
+    (pl.DataFrame({"id": []}, schema={"id": pl.Utf8}), {}),
+    # many row groups, with statistics
+    (
+        pl.DataFrame({"id": [f"id-{i}" for i in range(10_000)], "value": range(10_000)}),
+        {"row_group_size": 1000, "statistics": True},
+    ),
+    # big footer, many columns and row groups
+    (new_wide_df(n_row=2000, n_col=100), {"row_group_size": 500, "statistics": True}),
+    # nested types
+    (
+        pl.DataFrame(
+            {
+                "tags": [["a", "b"], [], None],
+                "struct": [{"x": 1, "y": "a"}, None, {"x": 3, "y": None}],
+            }
+        ),
+        {},
+    ),
+]
+
+
+@pytest.mark.parametrize("df, kwargs", cases)
+def test_parse_num_rows(df: pl.DataFrame, kwargs: dict):
+    data = write_parquet(df, **kwargs)
+    file_metadata, footer_length = extract_file_metadata(data)
+    assert len(file_metadata) == footer_length
+    assert parse_num_rows(file_metadata) == df.height
+
+    # polars stores the arrow schema in the key value metadata (field 5),
+    # after the row groups (field 4), skipping the whole FileMetaData
+    # struct must consume exactly the footer, not the trailing byte
+    assert b"ARROW:schema" in file_metadata
+    reader = _CompactReader(file_metadata + b"\x00")
+    reader.skip(_CT_STRUCT)
+    assert reader.pos == footer_length
+
+
+def test_extract_file_metadata():
+    data = write_parquet(new_wide_df(n_row=10, n_col=100))
+    file_metadata, footer_length = extract_file_metadata(data)
+    assert footer_length > 1024
+
+    # the tail is too short, tell the caller how many bytes to read
+    assert extract_file_metadata(data[-1024:]) == (None, footer_length)
+    tail = data[-(footer_length + FOOTER_TAIL_SIZE) :]
+    assert extract_file_metadata(tail) == (file_metadata, footer_length)
+
+    with pytest.raises(ParquetFooterError):
+        extract_file_metadata(b"PAR")
+    with pytest.raises(ParquetFooterError):
+        extract_file_metadata(b"not a parquet file")
+    # truncated footer
+    with pytest.raises(ParquetFooterError):
+        parse_num_rows(file_metadata[:10])
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=cls.bucket)
+
+    def test_get_parquet_num_rows_from_s3(self, monkeypatch):
+        s3_client = self.bsm.s3_client
+        df = new_wide_df(n_row=2000, n_col=20)
+        data = write_parquet(df, row_group_size=500, statistics=True)
+        _, footer_length = extract_file_metadata(data)
+        assert 1024 < footer_length < parquet_footer.DEFAULT_TAIL_READ_SIZE
+        s3path = S3Path(f"s3://{self.bucket}/file.parquet")
+        s3path.write_bytes(data, bsm=s3_client)
+
+        read_sizes = list()
+        read_tail = parquet_footer._read_tail
+
+        def _read_tail(s3_client, s3path, n_bytes):
+            read_sizes.append(n_bytes)
+            return read_tail(s3_client, s3path, n_bytes)
+
+        monkeypatch.setattr(parquet_footer, "_read_tail", _read_tail)
+
+        # the footer fits in the first GET
+        assert get_parquet_num_rows_from_s3(s3_client, s3path) == df.height
+        assert read_sizes == [parquet_footer.DEFAULT_TAIL_READ_SIZE]
+
+        # the footer is larger than the tail, it takes a second GET
+        read_sizes.clear()
+        assert (
+            get_parquet_num_rows_from_s3(s3_client, s3path, tail_read_size=1024)
+            == df.height
+        )
+        assert read_sizes == [1024, footer_length + FOOTER_TAIL_SIZE]
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.parquet_footer",
+        preview=False,
+    )
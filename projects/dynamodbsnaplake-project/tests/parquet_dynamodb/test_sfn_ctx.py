@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+
+import moto
+import pytest
+import botocore.exceptions
+
+from dynamodbsnaplake.vendor.parquet_dynamodb import sfn_ctx
+from dynamodbsnaplake.vendor.parquet_dynamodb.sfn_ctx import (
+    SfnCtx,
+    split_uri,
+    clear_sfn_ctx_cache,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+bucket = "my-bucket"
+s3dir_uri = f"s3://{bucket}/sfn-ctx"
+exec_arn = "arn:aws:states:us-east-1:111122223333:execution:my-sm:run-1"
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=bucket)
+
+    def setup_method(self):
+        clear_sfn_ctx_cache()
+
+    def spy_get_object(self, monkeypatch) -> list:
+        """
+        Record the ``(IfNoneMatch, not modified)`` of every ``get_object`` call.
+        """
+        calls = list()
+
+        def before_call(params, **kwargs):
+            calls.append([params.get("headers", {}).get("If-None-Match"), False])
+
+        self.bsm.s3_client.meta.events.register(
+            "before-call.s3.GetObject", before_call, unique_id="spy_get_object"
+        )
+        is_not_modified = sfn_ctx._is_not_modified
+
+        def _is_not_modified(e):
+            flag = is_not_modified(e)
+            calls[-1][1] = flag
+            return flag
+
+        monkeypatch.setattr(sfn_ctx, "_is_not_modified", _is_not_modified)
+        return calls
+
+    def teardown_method(self):
+        self.bsm.s3_client.meta.events.unregister(
+            "before-call.s3.GetObject", unique_id="spy_get_object"
+        )
+
+    def test_read_cache(self, monkeypatch):
+        s3_client = self.bsm.s3_client
+        calls = self.spy_get_object(monkeypatch)
+        data = {"key": "value", "unicode": "你好"}
+        uri = SfnCtx(exec_arn=exec_arn, data=data).write(
+            s3_client=s3_client, s3dir_uri=s3dir_uri
+        )
+        etag = s3_client.head_object(Bucket=bucket, Key=split_uri(uri)[1])["ETag"]
+
+        # the writer has the cache, the read is a 304
+        ctx = SfnCtx.read(s3_client=s3_client, s3dir_uri=s3dir_uri, exec_arn=exec_arn)
+        assert ctx.data == data
+        assert calls == [[etag, True]]
+
+        # another process (no cache) downloads it, then it's cached
+        clear_sfn_ctx_cache()
+        for _ in range(2):
+            ctx = SfnCtx.read(
+                s3_client=s3_client, s3dir_uri=s3dir_uri, exec_arn=exec_arn
+            )
+            assert ctx.data == data
+        assert calls[1:] == [[None, False], [etag, True]]
+
+        # the context is changed by another process, ETag mismatch, download it
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=split_uri(uri)[1],
+            Body=json.dumps({"key": "new value"}),
+        )
+        ctx = SfnCtx.read(s3_client=s3_client, s3dir_uri=s3dir_uri, exec_arn=exec_arn)
+        assert ctx.data == {"key": "new value"}
+        assert calls[3] == [etag, False]
+
+        # use_cache=False always downloads
+        ctx = SfnCtx.read(
+            s3_client=s3_client,
+            s3dir_uri=f"{s3dir_uri}/",
+            exec_arn=exec_arn,
+            use_cache=False,
+        )
+        assert ctx.data == {"key": "new value"}
+        assert calls[4] == [None, False]
+
+    def test_read_not_exists(self):
+        with pytest.raises(botocore.exceptions.ClientError):
+            SfnCtx.read(
+                s3_client=self.bsm.s3_client,
+                s3dir_uri=s3dir_uri,
+                exec_arn=f"{exec_arn}-not-exists",
+            )
+
+    def test_gzip(self, monkeypatch):
+        s3_client = self.bsm.s3_client
+        data = {"files": [f"s3://{bucket}/file-{i}.parquet" for i in range(1000)]}
+
+        def get_raw(uri: str) -> dict:
+            return s3_client.get_object(Bucket=bucket, Key=split_uri(uri)[1])
+
+        for compress in [True, False]:
+            exec_arn_ = f"{exec_arn}-{compress}"
+            uri = SfnCtx(exec_arn=exec_arn_, data=data).write(
+                s3_client=s3_client, s3dir_uri=s3dir_uri, compress=compress
+            )
+            res = get_raw(uri)
+            body = res["Body"].read()
+            if compress:
+                assert res["ContentEncoding"] == "gzip"
+                assert json.loads(gzip.decompress(body)) == data
+            else:
+                assert "ContentEncoding" not in res
+                assert json.loads(body) == data
+            # round trip without the in-memory cache
+            clear_sfn_ctx_cache()
+            ctx = SfnCtx.read(
+                s3_client=s3_client, s3dir_uri=s3dir_uri, exec_arn=exec_arn_
+            )
+            assert ctx.data == data
+
+        # compress only when it is larger than the threshold
+        monkeypatch.setattr(sfn_ctx, "COMPRESS_THRESHOLD", 1024)
+        uri = SfnCtx(exec_arn=f"{exec_arn}-large", data=data).write(
+            s3_client=s3_client, s3dir_uri=s3dir_uri
+        )
+        assert get_raw(uri)["ContentEncoding"] == "gzip"
+        uri = SfnCtx(exec_arn=f"{exec_arn}-small", data={"key": "value"}).write(
+            s3_client=s3_client, s3dir_uri=s3dir_uri
+        )
+        assert "ContentEncoding" not in get_raw(uri)
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.sfn_ctx",
+        preview=False,
+    )
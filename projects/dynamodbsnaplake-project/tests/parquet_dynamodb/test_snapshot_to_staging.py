@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import moto
+import polars as pl
+from s3pathlib import S3Path
+from polars_writer.api import Writer
+from dbsnaplake.api import (
+    S3Location,
+    DBSnapshotFileGroupManifestFile,
+    write_to_s3,
+    read_many_parquet_from_s3,
+)
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.snapshot_to_staging import (
+    Checkpoint,
+    split_data_file_list,
+    process_db_snapshot_file_group_manifest_file,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def test_split_data_file_list():
+    data_file_list = [{"size": size} for size in [3, 3, 5, 1, 1]]
+    assert split_data_file_list(data_file_list) == [data_file_list]
+    assert split_data_file_list(data_file_list, chunk_size=6) == [
+        [{"size": 3}, {"size": 3}],
+        [{"size": 5}, {"size": 1}],
+        [{"size": 1}],
+    ]
+    # a single file bigger than the chunk size is a chunk by itself
+    assert split_data_file_list(data_file_list, chunk_size=4) == [
+        [{"size": 3}],
+        [{"size": 3}],
+        [{"size": 5}],
+        [{"size": 1}, {"size": 1}],
+    ]
+
+
+class ChunkFailure(Exception):
+    pass
+
+
+def sort_by_uri(data_file_list):
+    # the partition order of group_by_partition is not stable
+    return sorted(data_file_list, key=lambda data_file: data_file["uri"])
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+    n_file = 6
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        s3_client = cls.bsm.s3_client
+        s3_client.create_bucket(Bucket=cls.bucket)
+        cls.s3_loc = S3Location(
+            s3uri_staging=f"s3://{cls.bucket}/staging/",
+            s3uri_datalake=f"s3://{cls.bucket}/datalake/",
+        )
+        polars_writer = Writer(format="parquet", parquet_compression="snappy")
+        s3dir_snapshot = S3Path(f"s3://{cls.bucket}/snapshot/").to_dir()
+        data_file_list = list()
+        for i in range(cls.n_file):
+            df = pl.DataFrame(
+                {
+                    "id": [f"{i}-{j}" for j in range(10)],
+                    "year": [str(2020 + j % 3) for j in range(10)],
+                }
+            )
+            s3path, size, etag = write_to_s3(
+                df=df,
+                s3_client=s3_client,
+                polars_writer=polars_writer,
+                s3dir=s3dir_snapshot,
+                fname=f"file-{i}",
+            )
+            data_file_list.append(
+                {
+                    "uri": s3path.uri,
+                    "size": size,
+                    "n_record": df.shape[0],
+                    "etag": etag,
+                }
+            )
+        # two files per chunk
+        cls.chunk_size = max(data_file["size"] for data_file in data_file_list) * 2
+        cls.manifest_file = DBSnapshotFileGroupManifestFile.new(
+            uri=s3dir_snapshot.joinpath("manifest-data.parquet").uri,
+            uri_summary=s3dir_snapshot.joinpath("manifest-summary.json").uri,
+            data_file_list=data_file_list,
+        )
+
+    def process(
+        self,
+        chunk_size=None,
+        checkpoint=None,
+        fail_at_chunk=None,
+    ):
+        """
+        Process the test DB snapshot file group, return the staging manifest,
+        the saved checkpoints and the chunks read. The ``fail_at_chunk``-th
+        read (0 based) raises :class:`ChunkFailure`, like a worker timeout.
+        """
+        saved_checkpoints = list()
+        read_chunks = list()
+
+        def batch_read(db_snapshot_file_group_manifest_file):
+            if len(read_chunks) == fail_at_chunk:
+                raise ChunkFailure
+            read_chunks.append(db_snapshot_file_group_manifest_file)
+            return read_many_parquet_from_s3(
+                s3path_list=[
+                    S3Path.from_s3_uri(data_file["uri"])
+                    for data_file in (
+                        db_snapshot_file_group_manifest_file.data_file_list
+                    )
+                ],
+                s3_client=self.bsm.s3_client,
+            )
+
+        staging_file_group_manifest_file = None
+        try:
+            staging_file_group_manifest_file = (
+                process_db_snapshot_file_group_manifest_file(
+                    db_snapshot_file_group_manifest_file=self.manifest_file,
+                    s3_client=self.bsm.s3_client,
+                    s3_loc=self.s3_loc,
+                    batch_read_snapshot_data_file_func=batch_read,
+                    partition_keys=["year"],
+                    sort_by=["id"],
+                    chunk_size=chunk_size,
+                    checkpoint=checkpoint,
+                    save_checkpoint=saved_checkpoints.append,
+                )
+            )
+        except ChunkFailure:
+            pass
+        return staging_file_group_manifest_file, saved_checkpoints, read_chunks
+
+    def test_resume_from_checkpoint(self):
+        expected, saved_checkpoints, read_chunks = self.process(
+            chunk_size=self.chunk_size
+        )
+        n_chunk = len(read_chunks)
+        assert n_chunk == 3
+        # no checkpoint after the last chunk
+        assert [
+            checkpoint.n_chunk_done for checkpoint in saved_checkpoints
+        ] == [1, 2]
+
+        for k in range(1, n_chunk):
+            # fail after chunk k, the worker only has the last saved checkpoint
+            manifest_file, saved_checkpoints, read_chunks = self.process(
+                chunk_size=self.chunk_size,
+                fail_at_chunk=k,
+            )
+            assert manifest_file is None
+            assert len(read_chunks) == k
+            checkpoint = Checkpoint.from_dict(saved_checkpoints[-1].to_dict())
+            assert checkpoint.n_chunk_done == k
+
+            manifest_file, _, read_chunks = self.process(
+                chunk_size=self.chunk_size,
+                checkpoint=checkpoint,
+            )
+            assert len(read_chunks) == n_chunk - k
+            assert sort_by_uri(manifest_file.data_file_list) == sort_by_uri(
+                expected.data_file_list
+            )
+            assert manifest_file.fingerprint == expected.fingerprint
+            assert manifest_file.n_record == expected.n_record
+            assert manifest_file.n_record == self.n_file * 10
+            assert manifest_file.uri_summary == expected.uri_summary
+
+    def test_checkpoint_with_other_chunk_size_is_discarded(self):
+        expected, _, _ = self.process(chunk_size=self.chunk_size)
+        bogus_file = {
+            "uri": f"s3://{self.bucket}/staging/bogus.parquet",
+            "size": 1,
+            "n_record": 1,
+            "etag": "bogus",
+        }
+        checkpoint = Checkpoint(
+            chunk_size=self.chunk_size * 2,
+            n_chunk_done=1,
+            staging_data_file_list=[bogus_file],
+        )
+        manifest_file, _, read_chunks = self.process(
+            chunk_size=self.chunk_size,
+            checkpoint=checkpoint,
+        )
+        assert len(read_chunks) == 3
+        assert bogus_file not in manifest_file.data_file_list
+        assert sort_by_uri(manifest_file.data_file_list) == sort_by_uri(
+            expected.data_file_list
+        )
+        assert manifest_file.fingerprint == expected.fingerprint
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.snapshot_to_staging",
+        preview=False,
+    )
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+import moto
+import polars as pl
+from s3pathlib import S3Path
+from polars_writer.api import Writer
+from dbsnaplake.api import (
+    S3Location,
+    StagingFileGroupManifestFile,
+    write_to_s3,
+)
+
+from dynamodbsnaplake.vendor.parquet_dynamodb.staging_dedup import (
+    StagingDedupIndex,
+    get_content_hash,
+    get_dedup_key,
+)
+from dynamodbsnaplake.vendor.parquet_dynamodb.staging_to_datalake import (
+    plan_partition_compaction,
+)
+from dynamodbsnaplake.tests.mock_aws import BaseMockAws
+
+
+def test_get_content_hash():
+    df = pl.DataFrame(
+        {
+            "id": ["a", "b", "c"],
+            "value": [1, 2, 3],
+            "tags": [["x"], [], ["y", "z"]],
+        }
+    )
+    content_hash = get_content_hash(df)
+    # row order doesn't matter
+    assert get_content_hash(df.reverse()) == content_hash
+    assert get_content_hash(df.sort("value", descending=True)) == content_hash
+    # but the content and the schema do
+    assert get_content_hash(df.head(2)) != content_hash
+    assert (
+        get_content_hash(df.with_columns(pl.col("value").cast(pl.Float64)))
+        != content_hash
+    )
+    assert get_content_hash(df.select("value", "id", "tags")) != content_hash
+    # a duplicated row is not the same content
+    assert get_content_hash(pl.concat([df, df.head(1)])) != content_hash
+
+
+class Test(BaseMockAws):
+    mock_list = [
+        moto.mock_s3,
+    ]
+    bucket = "my-bucket"
+
+    @classmethod
+    def setup_class_post_hook(cls):
+        cls.bsm.s3_client.create_bucket(Bucket=cls.bucket)
+        cls.polars_writer = Writer(format="parquet", parquet_compression="snappy")
+
+    def write_staging_file(self, s3dir: S3Path, fname: str, df: pl.DataFrame):
+        s3path, size, etag = write_to_s3(
+            df=df,
+            s3_client=self.bsm.s3_client,
+            polars_writer=self.polars_writer,
+            s3dir=s3dir,
+            fname=fname,
+        )
+        return {
+            "uri": s3path.uri,
+            "size": size,
+            "n_record": df.shape[0],
+            "etag": etag,
+        }
+
+    def test_get_reusable_file(self):
+        s3_client = self.bsm.s3_client
+        s3dir = S3Path(f"s3://{self.bucket}/run-1/staging/datalake/year=2024/")
+        df = pl.DataFrame({"id": ["a", "b"]})
+        staging_data_file = self.write_staging_file(s3dir, "file", df)
+        dedup_key = get_dedup_key("year=2024", get_content_hash(df))
+        index = StagingDedupIndex(files={dedup_key: staging_data_file})
+
+        assert (
+            index.get_reusable_file(s3_client=s3_client, dedup_key=dedup_key)
+            == staging_data_file
+        )
+        assert (
+            index.get_reusable_file(s3_client=s3_client, dedup_key="not-exists")
+            is None
+        )
+
+        # the file is overwritten, the ETag doesn't match
+        self.write_staging_file(s3dir, "file", pl.DataFrame({"id": ["c"]}))
+        assert (
+            index.get_reusable_file(s3_client=s3_client, dedup_key=dedup_key)
+            is None
+        )
+
+        # the file is deleted
+        S3Path.from_s3_uri(staging_data_file["uri"]).delete(bsm=s3_client)
+        assert (
+            index.get_reusable_file(s3_client=s3_client, dedup_key=dedup_key)
+            is None
+        )
+
+    def test_plan_partition_compaction(self):
+        s3_client = self.bsm.s3_client
+        s3_loc_1 = S3Location(
+            s3uri_staging=f"s3://{self.bucket}/plan/run-1/staging/",
+            s3uri_datalake=f"s3://{self.bucket}/plan/datalake/",
+        )
+        s3_loc_2 = S3Location(
+            s3uri_staging=f"s3://{self.bucket}/plan/run-2/staging/",
+            s3uri_datalake=f"s3://{self.bucket}/plan/datalake/",
+        )
+        df = pl.DataFrame({"id": ["a", "b"]})
+
+        def s3dir_partition(s3_loc: S3Location, year: str) -> S3Path:
+            return s3_loc.s3dir_staging_datalake.joinpath(f"year={year}").to_dir()
+
+        # year=2023 is reused from run 1, year=2024 has a reused file and
+        # a new file, year=2025 only has a new file
+        data_file_list = [
+            self.write_staging_file(s3dir_partition(s3_loc_1, "2023"), "f1", df),
+            self.write_staging_file(s3dir_partition(s3_loc_1, "2024"), "f2", df),
+            self.write_staging_file(s3dir_partition(s3_loc_2, "2024"), "f3", df),
+            self.write_staging_file(s3dir_partition(s3_loc_2, "2025"), "f4", df),
+        ]
+        StagingFileGroupManifestFile.new(
+            uri=s3_loc_2.s3dir_staging_file_group_manifest_data.joinpath(
+                "manifest-data-1.parquet"
+            ).uri,
+            uri_summary=s3_loc_2.s3dir_staging_file_group_manifest_summary.joinpath(
+                "manifest-summary-1.json"
+            ).uri,
+            data_file_list=data_file_list,
+        ).write(s3_client=s3_client)
+
+        manifest_file_list = plan_partition_compaction(
+            s3_client=s3_client,
+            s3_loc=s3_loc_2,
+        )
+        assert [
+            manifest_file.details["partition_uri"]
+            for manifest_file in manifest_file_list
+        ] == [
+            s3dir_partition(s3_loc_2, "2023").uri,
+            s3dir_partition(s3_loc_2, "2024").uri,
+            s3dir_partition(s3_loc_2, "2025").uri,
+        ]
+        assert [
+            sorted(data_file["uri"] for data_file in manifest_file.data_file_list)
+            for manifest_file in manifest_file_list
+        ] == [
+            [data_file_list[0]["uri"]],
+            [data_file_list[1]["uri"], data_file_list[2]["uri"]],
+            [data_file_list[3]["uri"]],
+        ]
+        for manifest_file in manifest_file_list:
+            assert S3Path(manifest_file.uri_summary).exists(bsm=s3_client)
+
+
+if __name__ == "__main__":
+    from dynamodbsnaplake.tests import run_cov_test
+
+    run_cov_test(
+        __file__,
+        "dynamodbsnaplake.vendor.parquet_dynamodb.staging_dedup",
+        preview=False,
+    )